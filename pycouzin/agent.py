@@ -1,10 +1,19 @@
+import numpy as np
+
+from pycouzin.graph import column_neighbors
+from pycouzin.neighborhood import rank_nearest
+from pycouzin.state import AGENT, AgentState
 from pycouzin.vector import Vector2D
 
 
-class Agent:
+class Agent(object):
     """
     Defines an agent.
 
+    The state of an agent lives in a row of its board's `AgentState` arrays;
+    the agent itself is a thin view onto that row. Until the board binds the
+    agent to its row, the state is held in a private single-row store.
+
     Parameters
     ----------
     board : Board
@@ -26,10 +35,20 @@ class Agent:
         The current orientation of this agent.
     i : int
         The index of this agent in the board's agent list.
+    kind : int
+        The type code of this agent, see `state.AgentState`. Starts as the
+        class's `initial_kind`, whose speed and maximum turning angle in
+        `Board.kinds` the agent starts with.
+    color : str
+        The plot color of this agent's kind.
     """
 
+    initial_kind = AGENT
+
     def __init__(self, board, p0=None, o0=None):
         self.board = board
+        self.state = AgentState(1)
+        self.row = 0
         if p0 is None:
             self.p = self.board.get_random_point()
         else:
@@ -41,9 +60,82 @@ class Agent:
             self.o = o0
 
         self.i = -1
-        self.speed = 0.5  # 0.5
-        self.thetamax = 0.05  # 0.2
-        self.replace_with = None
+        self.kind = self.initial_kind
+        params = board.kinds[self.kind]
+        self.speed = params['speed']
+        self.thetamax = params['thetamax']
+
+    def bind(self, state, i):
+        """
+        Moves this agent's state into row i of `state` and makes that row the
+        backing store of this agent.
+
+        Parameters
+        ----------
+        state : AgentState
+        i : int
+        """
+        state.copy_row(i, self.state, self.row)
+        self.state = state
+        self.row = i
+        self.i = i
+
+    @property
+    def p(self):
+        x, y = self.state.pos[self.row]
+        return Vector2D(x, y)
+
+    @p.setter
+    def p(self, v):
+        self.state.pos[self.row] = (v.x, v.y)
+
+    @property
+    def o(self):
+        x, y = self.state.ori[self.row]
+        return Vector2D(x, y)
+
+    @o.setter
+    def o(self, v):
+        self.state.ori[self.row] = (v.x, v.y)
+
+    @property
+    def speed(self):
+        return self.state.speed[self.row]
+
+    @speed.setter
+    def speed(self, value):
+        self.state.speed[self.row] = value
+
+    @property
+    def thetamax(self):
+        return self.state.thetamax[self.row]
+
+    @thetamax.setter
+    def thetamax(self, value):
+        self.state.thetamax[self.row] = value
+
+    @property
+    def kind(self):
+        return self.state.kind[self.row]
+
+    @kind.setter
+    def kind(self, value):
+        self.state.kind[self.row] = value
+
+    @property
+    def color(self):
+        return self.board.kinds[self.kind]['color']
+
+    def transition(self, kind):
+        """
+        Queues a change of this agent to another kind at the end of the time
+        step, see `Board.queue_transition()`.
+
+        Parameters
+        ----------
+        kind : int
+        """
+        self.board.queue_transition(self.i, kind)
 
     def find_nearest_neighbors(self, max_k, min_k):
         """
@@ -51,22 +143,39 @@ class Agent:
         agent and excludes the min_k nearest neighbors at the current time
         step.
 
+        Use `Board.find_nearest_neighbors()` to find the neighbors of all
+        agents at once.
+
         Parameters
         ----------
-        k : int
+        max_k : int
+        min_k : int
+        """
+        d = np.sqrt(((self.board.state.pos - self.state.pos[self.row]) ** 2)
+                    .sum(axis=1))
+        d[self.i] = np.inf
+        self.nearest = rank_nearest(d[np.newaxis, :], max_k, min_k)[0].tolist()
+
+    def noise_vector(self, std):
         """
-        def distance(row):
-            po = Vector2D(row['x'], row['y'])
-            return self.p.distance_to(po)
+        Returns this agent's noise for the current time step, scaled to
+        standard deviation `std`. It is read from the board's noise array
+        when one was drawn for the step, and drawn from the board's
+        generator otherwise.
 
-        df = self.board.agent_df()
-        df = df[df['i'] != self.i]  # Ignore present agent
-        df['distances'] = df.apply(distance, axis=1)
-        df = df.sort('distances', ascending=True)
-        df = df.head(max_k)
-        df = df.tail(max_k - min_k)
+        Parameters
+        ----------
+        std : number
 
-        self.nearest = df['i'].tolist()
+        Returns
+        -------
+        noise : Vector2D
+        """
+        if self.board.noise is None or self.i < 0:
+            x, y = self.board.rng.normal(0, std, 2)
+        else:
+            x, y = self.board.noise[self.i] * std
+        return Vector2D(x, y)
 
     def update(self, a_r, a_o, a_a, a_k, agents):
         """
@@ -90,12 +199,6 @@ class Agent:
     def get_adjacent_agents(self, a, agents):
         """
         Returns a list of agents adjacent to this agent defined by adjacency
-        matrix a.
+        matrix a, which may be dense or sparse.
         """
-        adj_agents = []
-        for j in range(len(agents)):
-            if j == self.i:
-                continue
-            if a[j, self.i] == 1:
-                adj_agents.append(agents[j])
-        return adj_agents
+        return [agents[j] for j in column_neighbors(a, self.i) if j != self.i]
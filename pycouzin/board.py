@@ -1,12 +1,23 @@
-import random
 import numpy as np
-from numpy import linalg as la
 import pandas as pd
-import copy
 
+from pycouzin import graph, rng, spectral
+from pycouzin.agent import Agent
+from pycouzin.cell_list import CellList
+from pycouzin.neighborhood import nearest_matrix
+from pycouzin.search import BruteForceSearch, KDTreeSearch, VerletList
+from pycouzin.state import KINDS, AgentState
 from pycouzin.vector import Vector2D
 
 
+# Neighbor search backends selectable with the `search` argument of `Board`
+SEARCHES = {
+    'brute': BruteForceSearch,
+    'cells': CellList,
+    'kdtree': KDTreeSearch,
+}
+
+
 class Board:
     """
     General class defining a board.
@@ -20,17 +31,260 @@ class Board:
     agent_init : function : self -> list of Agent
         A function taking this board object as a parameter and returns a list
         of n agents. This function is used to initialize the agent list.
+    search : str
+        The neighbor search backend used for radius and nearest neighbor
+        queries, one of the keys of `SEARCHES`. 'brute' (default) compares
+        all pairs of agents; 'cells' uses a `CellList`, which scales to large
+        boards when interaction radii are small; 'kdtree' uses a SciPy
+        KD-tree, which copes with large radii and large boards alike.
+    sparse : boolean
+        If True, adjacency matrices and laplacians are built as SciPy sparse
+        matrices, so memory grows with the number of edges rather than n^2.
+        Defaults to False.
+    seed : None, int, numpy.random.SeedSequence or numpy.random.Generator
+        Seeds the board's random number generator, see `rng.make_rng()`. All
+        randomness of a simulation, from the initial positions to the noise
+        of each step, is drawn from it, so equal seeds give identical runs.
+        Defaults to None, which seeds from OS entropy.
+    skin : number
+        If positive, `build_index()` keeps a `VerletList` of the pairs
+        within cell_size + skin and only rebuilds it once some agent has
+        moved more than skin / 2 since it was built. Pick a skin of a few
+        times the distance agents move per step. Defaults to 0, which
+        rebuilds the search every time.
+
+    Attributes
+    ----------
+    bidirectional : boolean
+        Whether adjacency matrices built by this board are made symmetric
+        (see `bidirectional_adjacency()`). Subclasses overriding `adjacency()`
+        with `bidirectional_adjacency()` should set this to True so the
+        vectorized `radius_adjacency()` and `nearest_adjacency()` agree with
+        the generic path.
+    state : AgentState
+        The positions, orientations, speeds, maximum turning angles and
+        kinds of all agents, stored as contiguous arrays indexed by agent
+        index.
+    kinds : dict
+        Maps each type code to the 'name', 'speed', 'thetamax' and 'color'
+        of its agents, see `state.KINDS`. Agents take on the speed and
+        maximum turning angle of their kind when created or when they change
+        kind.
+    transitions : list of tuple
+        The log of kind changes applied by `apply_transitions()`, as
+        (step, i, old kind, new kind) tuples.
+    on_transition : function : board, (step, i, old, new) -> None, or None
+        Called with each logged transition, defaults to None.
+    rng : numpy.random.Generator
+        The random number generator of this board.
+    noise : numpy.ndarray or None
+        An nx2 array of standard normal noise for the current time step, see
+        `draw_noise()`.
+    index : NeighborSearch or None
+        The neighbor search built by the last call to `build_index()`.
+    index_builds : int
+        The number of times `build_index()` has searched the positions from
+        scratch rather than reusing the Verlet list.
+    drift : number
+        An upper bound on how far any agent has moved since `index` was
+        built. Boards moving agents after building the index must keep it
+        up to date.
+    fiedler_method : str
+        The solver used by `get_fied()`, see `spectral.fiedler()`. Defaults
+        to 'auto'.
+    fiedler_tolerance : number or None
+        The convergence tolerance of the iterative Fiedler solvers, or None
+        (default) for the solver's default.
     """
 
-    def __init__(self, n, m, agent_init):
+    bidirectional = False
+    fiedler_method = 'auto'
+    fiedler_tolerance = None
+
+    def __init__(self, n, m, agent_init, search='brute', sparse=False,
+                 seed=None, skin=0):
+        if search not in SEARCHES:
+            raise ValueError('Unknown neighbor search %r' % search)
+        if sparse and graph.sparse is None:
+            raise ImportError('Sparse adjacency matrices require scipy')
         self.n = n
         self.m = m
+        self.search = search
+        self.sparse = sparse
+        self.skin = skin
+        self.index = None
+        self.index_builds = 0
+        self.drift = 0
+        self.fiedler_vectors = {}
+        self.rng = rng.make_rng(seed)
+        self.noise = None
+        self.kinds = dict((code, dict(params))
+                          for code, params in KINDS.items())
+        self.transitions = []
+        self.on_transition = None
+        self._pending = []
 
         self.agents = agent_init(self)
         assert len(self.agents) == self.n
+        self.state = AgentState(self.n)
         for i in range(self.n):
-            # Let each agent know its index
-            self.agents[i].i = i
+            # Let each agent know its index and move its state into the board
+            self.agents[i].bind(self.state, i)
+
+    @classmethod
+    def from_arrays(cls, pos, ori=None, m=None, search='brute',
+                    sparse=False):
+        """
+        Builds a board of plain agents at the given positions, e.g. to apply
+        the metric methods of this class to a recorded frame.
+
+        Parameters
+        ----------
+        pos : numpy.ndarray
+            An nx2 array of positions.
+        ori : numpy.ndarray or None
+            An nx2 array of orientations, defaults to zeros.
+        m : number or None
+            The size of the board, defaults to the largest coordinate.
+        search : str
+            See `Board`.
+        sparse : boolean
+            See `Board`.
+
+        Returns
+        -------
+        board : Board
+        """
+        pos = np.asarray(pos, dtype=float)
+        n = pos.shape[0]
+        if m is None:
+            m = np.abs(pos).max() if n > 0 else 1
+
+        def agent_init(board):
+            return [Agent(board, Vector2D(0, 0), Vector2D(0, 0))
+                    for i in range(n)]
+        board = cls(n, m, agent_init, search=search, sparse=sparse)
+        board.state.pos[:] = pos
+        if ori is not None:
+            board.state.ori[:] = ori
+        return board
+
+    def queue_transition(self, i, kind):
+        """
+        Queues a change of agent i to another kind, which takes effect at
+        the next call to `apply_transitions()`, usually the end of the time
+        step. Until then the agent keeps its kind, so every agent sees the
+        same kinds during a step.
+
+        Parameters
+        ----------
+        i : int
+        kind : int
+            A type code of `kinds`.
+        """
+        self._pending.append((i, kind))
+
+    def apply_transitions(self, step=None):
+        """
+        Changes the kind of every agent queued with `queue_transition()` in
+        place: its row of `state.kind` is updated and it takes on the speed
+        and maximum turning angle of its new kind. Each change is logged to
+        `transitions` and passed to `on_transition`.
+
+        Parameters
+        ----------
+        step : int or None
+            The time step recorded with the changes.
+        """
+        pending, self._pending = self._pending, []
+        state = self.state
+        for i, kind in pending:
+            old = state.kind[i]
+            if old == kind:
+                continue
+            params = self.kinds[kind]
+            state.kind[i] = kind
+            state.speed[i] = params['speed']
+            state.thetamax[i] = params['thetamax']
+            event = (step, i, int(old), kind)
+            self.transitions.append(event)
+            if self.on_transition is not None:
+                self.on_transition(self, event)
+
+    def make_search(self, cell_size, pos=None):
+        """
+        Builds a neighbor search of this board's backend.
+
+        Parameters
+        ----------
+        cell_size : number
+            The largest radius that will usually be queried.
+        pos : numpy.ndarray or None
+            The positions to search, defaults to the current agent positions.
+
+        Returns
+        -------
+        search : NeighborSearch
+        """
+        if pos is None:
+            pos = self.state.pos
+        return SEARCHES[self.search](pos, cell_size)
+
+    def build_index(self, cell_size):
+        """
+        Rebuilds the neighbor search over a snapshot of the current agent
+        positions.
+
+        With a positive `skin`, the Verlet list of the last call is moved to
+        the current positions instead, unless some agent has moved more than
+        skin / 2 since it was built or cell_size has changed.
+
+        Parameters
+        ----------
+        cell_size : number
+            The largest radius that will usually be queried.
+        """
+        self.drift = 0
+        index = self.index
+        if (self.skin > 0 and isinstance(index, VerletList) and
+                index.radius == cell_size and
+                index.refresh(self.state.pos)):
+            return
+        self.index_builds += 1
+        if self.skin > 0:
+            search = self.make_search(cell_size + self.skin,
+                                      self.state.pos.copy())
+            self.index = VerletList(search, cell_size, self.skin)
+        else:
+            self.index = self.make_search(cell_size, self.state.pos.copy())
+
+    def neighbors(self, i, radius):
+        """
+        Returns the indices of the agents within `radius` (inclusive) of
+        agent i at their current positions, in increasing order.
+
+        When an index has been built, only the candidates it reports within
+        radius + 2 * drift are checked.
+
+        Parameters
+        ----------
+        i : int
+        radius : number
+
+        Returns
+        -------
+        neighbors : numpy.ndarray
+        """
+        pos = self.state.pos
+        if self.index is None:
+            candidates = np.arange(self.n)
+        else:
+            _, candidates = self.index.candidates(radius + 2 * self.drift,
+                                                  [i])
+            candidates.sort()
+        d = np.sqrt(((pos[candidates] - pos[i]) ** 2).sum(axis=1))
+        keep = (d <= radius) & (candidates != i)
+        return candidates[keep]
 
     def get_random_point(self):
         """
@@ -40,14 +294,30 @@ class Board:
         -------
         point : Vector2D
         """
-        x = random.uniform(-self.m, self.m)
-        y = random.uniform(-self.m, self.m)
+        x, y = self.rng.uniform(-self.m, self.m, 2)
         return Vector2D(x, y)
 
+    def draw_noise(self):
+        """
+        Draws standard normal noise for every agent at once, to be scaled by
+        each agent's noise level. Boards call this once per time step.
+
+        Returns
+        -------
+        noise : numpy.ndarray
+            The nx2 array, also stored in `noise`.
+        """
+        self.noise = self.rng.standard_normal((self.n, 2))
+        return self.noise
+
     def adjacency(self, condition, state_update=None):
         """
         Returns an adjacency matrix based on the given condition.
 
+        This is the generic path for custom conditions; `radius_adjacency()`
+        and `nearest_adjacency()` build their matrices directly from the
+        agent state arrays.
+
         Parameters
         ----------
         condition : function : agent, agent -> boolean
@@ -119,36 +389,62 @@ class Board:
         A : numpy.ndarray
             See `self.adjacency()`
         """
-        def condition(a1, a2):
-            d = a1.p.distance_to(a2.p)
-            if d < max_radius and d >= min_radius:
-                return True
-            else:
-                return False
-
-        return self.adjacency(condition)
+        i, j, _ = self.make_search(max_radius).pairs(max_radius, min_radius)
+        return graph.adjacency_matrix(i, j, self.n, self.sparse)
 
     def nearest_adjacency(self, max_k, min_k=0):
         """
         Returns an adjacency matrix where i is connected to j if i is one of
-        j's k nearest neighbors.
+        j's k nearest neighbors. Each agent's neighbors are also stored in
+        `agent.nearest`.
 
         Parameters
         ----------
-        k : int
+        max_k : int
+        min_k : int
+            The min_k nearest neighbors are excluded, defaults to 0.
 
         Returns
         -------
         A : numpy.ndarray
             See `self.adjacency()`
         """
-        def state_update(agent):
-            agent.find_nearest_neighbors(max_k, min_k)
+        nearest = self.find_nearest_neighbors(max_k, min_k)
+        return nearest_matrix(nearest, self.bidirectional, self.sparse)
+
+    def find_nearest_neighbors(self, max_k, min_k=0):
+        """
+        Finds the max_k nearest neighbors of every agent at once, excluding
+        each agent's min_k nearest neighbors, and stores them in
+        `agent.nearest`.
+
+        Parameters
+        ----------
+        max_k : int
+        min_k : int
+
+        Returns
+        -------
+        nearest : numpy.ndarray
+            An n x (max_k - min_k) array where row i holds the indices of
+            agent i's neighbors, closest first.
+        """
+        # Cells sized to hold about max_k agents at the initial density
+        cell_size = 2 * self.m * np.sqrt(max(max_k, 1) / float(self.n))
+        nearest = self.make_search(cell_size).nearest(max_k, min_k)
+        self.set_nearest(nearest)
+        return nearest
 
-        def condition(a1, a2):
-            return a2.i in a1.nearest
+    def set_nearest(self, nearest):
+        """
+        Stores row i of `nearest` as the neighbor list of agent i.
 
-        return self.adjacency(condition, state_update=state_update)
+        Parameters
+        ----------
+        nearest : numpy.ndarray
+        """
+        for agent in self.agents:
+            agent.nearest = nearest[agent.i].tolist()
 
     def laplacian(self, adjacency):
         """
@@ -162,52 +458,87 @@ class Board:
 
         Parameters
         ----------
-        adjacency : numpy.ndarray
+        adjacency : numpy.ndarray or scipy.sparse matrix
 
         Returns
         -------
-        laplacian : numpy.ndarray
+        laplacian : numpy.ndarray or scipy.sparse.csc_matrix
+            Sparse if `adjacency` is sparse.
         """
-        l = copy.deepcopy(adjacency)
-        s = np.sum(adjacency, axis=1)
-        l = l * -1
-        for i in range(self.n):
-            l[i, i] = s[i]
-        return l
+        return graph.laplacian(adjacency)
 
-    def is_connected(self, laplacian, tolerance=0.00001):
+    def is_connected(self, laplacian, tolerance=0.00001, method='graph'):
         """
         Returns True if the network represented by the given laplacian is
         fully connected, false otherwise.
 
+        For asymmetric laplacians, connected means that the zero eigenvalue
+        is simple, i.e. that the graph has a directed spanning tree.
+
         Parameters
         ----------
-        laplacian : numpy.ndarray
+        laplacian : numpy.ndarray or scipy.sparse matrix
         tolerance : number
-            The tolerance at which to check the second largest eigenvalue.
+            The tolerance at which to check the second largest eigenvalue,
+            only used by the spectral method.
+        method : str
+            'graph' (default) counts the closed strongly connected components
+            of the graph by traversal, which is exact. 'spectral' thresholds
+            the Fiedler eigenvalue.
 
         Returns
         -------
         connected : boolean
         """
-        fied = self.get_fied(laplacian)
-        return fied > tolerance
+        if method == 'spectral':
+            fied = self.get_fied(laplacian)
+            return np.real(fied) > tolerance
+        elif method == 'graph':
+            return graph.closed_components(laplacian) == 1
+        raise ValueError('Unknown connectivity method %r' % method)
+
+    def components(self, adjacency):
+        """
+        Finds the connected components of a network, ignoring edge
+        directions.
+
+        Parameters
+        ----------
+        adjacency : numpy.ndarray or scipy.sparse matrix
+            An adjacency matrix or laplacian.
+
+        Returns
+        -------
+        count : int
+            The number of components.
+        sizes : numpy.ndarray
+            The number of agents in each component, largest first.
+        """
+        sizes = graph.component_sizes(adjacency)
+        return len(sizes), sizes
 
-    def get_fied(self, laplacian):
+    def get_fied(self, laplacian, key=None):
         """
         Gets the Fiedler eigenvalue of the specified Laplacian
 
         Parameters
         ----------
-        laplacian : numpy.ndarray
+        laplacian : numpy.ndarray or scipy.sparse matrix
+        key : hashable or None
+            Names the graph the laplacian belongs to. When given, the Fiedler
+            vector found by an iterative solver is kept and used as the
+            starting guess for the next laplacian with the same key.
 
         Returns
         -------
         w[1] : the Fiedler eigenvalue
         """
-        w, v = la.eig(laplacian)
-        w.sort()
-        return w[1]
+        value, vector = spectral.fiedler(laplacian, self.fiedler_method,
+                                         self.fiedler_tolerance,
+                                         self.fiedler_vectors.get(key))
+        if key is not None and vector is not None:
+            self.fiedler_vectors[key] = vector
+        return value
 
     def agent_df(self):
         """
@@ -217,11 +548,8 @@ class Board:
         -------
         df : pandas.DataFrame
         """
-        df = {}
-        for agent in self.agents:
-            df[agent.i] = {
-                'i': agent.i,
-                'x': agent.p.x,
-                'y': agent.p.y
-            }
-        return pd.DataFrame(df).transpose()
+        return pd.DataFrame({
+            'i': np.arange(self.n),
+            'x': self.state.pos[:, 0],
+            'y': self.state.pos[:, 1]
+        }, columns=['i', 'x', 'y'])
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+
+from pycouzin.search import NeighborSearch
+
+
+# The largest number of cells along either side of the grid
+MAX_CELLS = 2 ** 20
+
+
+class CellList(NeighborSearch):
+    """
+    A uniform grid spatial index over a set of positions.
+
+    Positions are binned into square cells and the keys of the occupied
+    cells are kept in a sorted array, looked up with `numpy.searchsorted`,
+    so only the cells around an agent need to be visited to find its
+    neighbors. With a cell size close to the largest
+    query radius, radius queries take time roughly linear in the number of
+    agents plus the number of pairs found.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    cell_size : number
+        The side length of a cell, usually the largest interaction radius.
+        Sizes that would give more than MAX_CELLS cells along a side,
+        including zero, are raised to the smallest size that does not.
+    """
+
+    def __init__(self, pos, cell_size):
+        self.pos = pos
+        self.n = pos.shape[0]
+        lo = pos.min(axis=0) if self.n > 0 else np.zeros(2)
+        span = (pos.max(axis=0) - lo).max() if self.n > 0 else 0
+        self.cell_size = max(float(cell_size), span / float(MAX_CELLS),
+                             np.finfo(float).tiny)
+
+        cells = np.floor((pos - lo) / self.cell_size).astype(np.int64)
+        self.cx = cells[:, 0]
+        self.cy = cells[:, 1]
+        self.nx = int(self.cx.max()) + 1 if self.n > 0 else 1
+        self.ny = int(self.cy.max()) + 1 if self.n > 0 else 1
+
+        keys = self.cx * self.ny + self.cy
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys, self.starts, self.counts = np.unique(
+            keys[self.order], return_index=True, return_counts=True)
+
+    def candidates(self, radius, agents=None):
+        """
+        Returns every ordered pair (i, j), i != j, where j is in a cell close
+        enough to i's cell to possibly be within `radius` of i.
+
+        See `NeighborSearch.candidates()`.
+        """
+        if agents is None:
+            agents = np.arange(self.n)
+        agents = np.asarray(agents, dtype=np.int64)
+        reach = max(self.nx, self.ny)
+        if radius < reach * self.cell_size:
+            reach = max(int(math.ceil(radius / self.cell_size)), 1)
+        if (2 * reach + 1) ** 2 >= len(self.keys):
+            # Visiting the cells would touch every occupied cell anyway
+            i = np.repeat(agents, self.n)
+            j = np.tile(np.arange(self.n), len(agents))
+            keep = i != j
+            return i[keep], j[keep]
+
+        i_parts = []
+        j_parts = []
+        for ox in range(-reach, reach + 1):
+            for oy in range(-reach, reach + 1):
+                tx = self.cx[agents] + ox
+                ty = self.cy[agents] + oy
+                valid = (tx >= 0) & (tx < self.nx) & \
+                    (ty >= 0) & (ty < self.ny)
+                src = agents[valid]
+                tkey = tx[valid] * self.ny + ty[valid]
+                loc = np.searchsorted(self.keys, tkey)
+                loc[loc == len(self.keys)] = 0
+                found = self.keys[loc] == tkey
+                src = src[found]
+                loc = loc[found]
+
+                lengths = self.counts[loc]
+                total = lengths.sum()
+                if total == 0:
+                    continue
+                ends = np.cumsum(lengths)
+                within = np.arange(total) - np.repeat(ends - lengths, lengths)
+                j = self.order[np.repeat(self.starts[loc], lengths) + within]
+                i_parts.append(np.repeat(src, lengths))
+                j_parts.append(j)
+
+        if not i_parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        i = np.concatenate(i_parts)
+        j = np.concatenate(j_parts)
+        keep = i != j
+        return i[keep], j[keep]
+
+    def nearest(self, max_k, min_k=0):
+        """
+        Finds the neighbors of every agent ranked min_k (inclusive) to max_k
+        (exclusive) by distance, closest first.
+
+        The search radius starts at one cell and is doubled for the agents
+        that have fewer than max_k other agents within it.
+
+        See `NeighborSearch.nearest()`.
+        """
+        max_k, min_k = int(max_k), int(min_k)
+        available = min(max_k, self.n - 1)
+        start = max(available - (max_k - min_k), 0)
+        nearest = np.zeros((self.n, max(available - start, 0)), dtype=int)
+        if nearest.shape[1] == 0:
+            return nearest
+
+        span = (self.pos.max(axis=0) - self.pos.min(axis=0)).sum()
+        radius = self.cell_size
+        pending = np.arange(self.n)
+        while len(pending) > 0:
+            # Beyond the extent of the agents every agent is a candidate
+            if radius > span:
+                radius = np.inf
+            i, j, d = self.pairs(radius, agents=pending)
+            found = np.bincount(i, minlength=self.n)
+            done = found[pending] >= available
+            resolved = pending[done]
+            pending = pending[~done]
+            radius *= 2
+            if len(resolved) == 0:
+                continue
+
+            keep = found[i] >= available
+            i, j, d = i[keep], j[keep], d[keep]
+            order = np.lexsort((d, i))
+            i, j = i[order], j[order]
+            first = np.searchsorted(i, i)
+            rank = np.arange(len(i)) - first
+            keep = (rank >= start) & (rank < available)
+            nearest[resolved] = j[keep].reshape(len(resolved), -1)
+        return nearest
@@ -1,10 +1,21 @@
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import numpy as np
+import pandas as pd
 import os
 import math
+import time
+from functools import partial
 
+from pycouzin import kernels, order
 from pycouzin.board import Board
+from pycouzin.neighborhood import Neighborhood, REPULSION, ORIENTATION, \
+    ATTRACTION
+from pycouzin.schedule import MetricSchedule
+from pycouzin.state import PREY, PREDATOR, DEAD
+
+
+# The Fiedler eigenvalues returned by `CouzinBoard.update()`, in order
+FIEDLER_KEYS = ('attraction', 'orientation', 'repulsion', 'nearest',
+                'combined')
 
 
 class CouzinBoard(Board):
@@ -31,14 +42,70 @@ class CouzinBoard(Board):
         neighbor dynamics.
     t : int
         The number of time steps to simulate, default = 100.
+    search : str
+        See `Board`. The neighbor search is rebuilt every step with a cell
+        size of the largest zone radius.
+    sparse : boolean
+        See `Board`.
+    vectorize : boolean
+        If True, agents whose dynamics have a batched kernel (see
+        `kernels.batch_rule()`) are updated all at once from the state at the
+        start of each step, before the remaining agents are updated one by
+        one. Defaults to False.
+    update_mode : str
+        'sequential' (default) updates the agents in list order, each moving
+        in place, so agents later in the list see the new state of those
+        before them. 'synchronous' has every agent read the state at step t
+        and write its step t+1 state into a second buffer, which replaces
+        the state once all agents have been updated; the result is then
+        independent of the order of the agents.
+    seed : None, int, numpy.random.SeedSequence or numpy.random.Generator
+        See `Board`.
+    skin : number
+        See `Board`. The neighbor list then holds the pairs within
+        max(rr, ro, ra) + skin, and the zones are classified from its
+        pairs. Since prey move at most 1.5 per step, a skin of 5 to 10 lets
+        most steps reuse the list.
+
+    Attributes
+    ----------
+    metrics : MetricSchedule
+        The metrics computed after each step. The Fiedler eigenvalues (named
+        as in FIEDLER_KEYS) are enabled every step. 'connected', whether the
+        combined zone graph is connected, and 'order', the order parameters
+        of `order.order_parameters()` after the step, are registered but
+        disabled.
+    record : dict
+        The metrics computed at the last step.
+    time : int
+        The number of steps taken.
     """
-    def __init__(self, n, m, agent_init, rr, ro, ra, k, t=100):
-        Board.__init__(self, n, m, agent_init)
+    bidirectional = True
+
+    def __init__(self, n, m, agent_init, rr, ro, ra, k, t=100,
+                 search='brute', sparse=False, vectorize=False,
+                 update_mode='sequential', seed=None, skin=0):
+        if update_mode not in ('sequential', 'synchronous'):
+            raise ValueError('Unknown update mode %r' % update_mode)
+        Board.__init__(self, n, m, agent_init, search, sparse, seed, skin)
+        self.vectorize = vectorize
+        self.update_mode = update_mode
         self.rr = rr
         self.ro = ro
         self.ra = ra
         self.k = k
         self.t = t
+        self._adjacencies = None
+        self.time = 0
+        self.record = {}
+        self.metrics = MetricSchedule()
+        for key in FIEDLER_KEYS:
+            self.metrics.register(key, partial(CouzinBoard.fiedler_value,
+                                               key=key))
+        self.metrics.register('connected', CouzinBoard.connected,
+                              enabled=False)
+        self.metrics.register('order', CouzinBoard.order_parameters,
+                              enabled=False)
 
     def adjacency(self, condition, state_update=None):
         """
@@ -47,39 +114,406 @@ class CouzinBoard(Board):
         """
         return self.bidirectional_adjacency(condition, state_update)
 
+    def neighborhood(self):
+        """
+        Rebuilds the neighbor search, computes the neighborhood structure of
+        the board at the current time step and stores each agent's k nearest
+        neighbors in `agent.nearest`.
+
+        Returns
+        -------
+        neighborhood : Neighborhood
+        """
+        self.build_index(max(self.rr, self.ro, self.ra))
+        nb = Neighborhood(self.state.pos, self.rr, self.ro, self.ra, self.k,
+                          self.index)
+        self.set_nearest(nb.nearest)
+        return nb
+
     def update(self):
         """
-        Updates the position of the agents on the board.
-        """
-        # First replace any agent with a new type if required
-        for i in range(len(self.agents)):
-            agent = self.agents[i]
-            if agent.replace_with is not None:
-                print 'Replacing agent %i' % i
-                self.agents[i] = agent.replace_with
-
-        def fied_adj(a):
-            return self.get_fied(self.laplacian(a))
-        a_r = self.radius_adjacency(self.rr)
-        a_o = self.radius_adjacency(self.ro, self.rr)
-        a_a = self.radius_adjacency(self.ra, self.ro)
-        a_k = self.nearest_adjacency(self.k)
+        Updates the position of the agents on the board and computes the
+        metrics due at this step, which are stored in `record`.
+
+        Returns
+        -------
+        fiedler : tuple
+            The Fiedler eigenvalues of the neighborhood at the start of the
+            step, in the order of FIEDLER_KEYS, with None for those that
+            were not computed.
+        """
+        i = self.time
+        self.record = self.measure(self.step(), i)
+        return tuple(self.record.get(key) for key in FIEDLER_KEYS)
+
+    def step(self):
+        """
+        Advances the agents by one time step without computing any metrics.
+        Changes of kind queued during the step, such as kills, are applied
+        at its end, see `Board.apply_transitions()`.
+
+        Returns
+        -------
+        neighborhood : Neighborhood
+            The neighborhood at the start of the step, which the agents
+            moved by.
+        """
+        self.draw_noise()
+        nb = self.neighborhood()
+        if self.update_mode == 'synchronous':
+            # Agents write into the next buffer while the board's state, and
+            # so every other agent, still holds step t
+            target = self.state.next_buffer()
+        else:
+            target = self.state
+        if self.vectorize:
+            self.batch_move(nb, target)
         for agent in self.agents:
-            agent.update(a_r, a_o, a_a, a_k, self.agents)
-        return fied_adj(a_a), fied_adj(a_o), fied_adj(a_r), fied_adj(a_k), \
-            fied_adj(a_a + a_o + a_r)
+            if self.vectorize and kernels.batch_rule(agent) is not None:
+                continue
+            a_r, a_o, a_a, a_k = self.adjacencies(nb)
+            if self.index.spatial:
+                # Keep track of how far agents move away from the index
+                p0 = self.state.pos[agent.i].copy()
+            agent.state = target
+            try:
+                agent.update(a_r, a_o, a_a, a_k, self.agents)
+            finally:
+                agent.state = self.state
+            if self.index.spatial:
+                moved = np.sqrt(((target.pos[agent.i] - p0) ** 2).sum())
+                self.drift = max(self.drift, moved)
+        if target is not self.state:
+            self.state.swap()
+        self.apply_transitions(self.time)
+        self.time += 1
+        return nb
+
+    def adjacencies(self, nb):
+        """
+        Returns the adjacency matrices of a neighborhood. They are built once
+        per neighborhood and reused by later calls.
+
+        Parameters
+        ----------
+        nb : Neighborhood
+
+        Returns
+        -------
+        a_r : numpy.ndarray or scipy.sparse.csc_matrix
+        a_o : numpy.ndarray or scipy.sparse.csc_matrix
+        a_a : numpy.ndarray or scipy.sparse.csc_matrix
+            The zone of repulsion, orientation and attraction matrices.
+        a_k : numpy.ndarray or scipy.sparse.csc_matrix
+            The bidirectional k nearest neighbor matrix.
+        """
+        if self._adjacencies is None or self._adjacencies[0] is not nb:
+            self._adjacencies = (nb, (
+                nb.zone_adjacency(REPULSION, self.sparse),
+                nb.zone_adjacency(ORIENTATION, self.sparse),
+                nb.zone_adjacency(ATTRACTION, self.sparse),
+                nb.nearest_adjacency(bidirectional=True,
+                                     as_sparse=self.sparse)))
+        return self._adjacencies[1]
+
+    def measure(self, nb, step=None, names=None):
+        """
+        Computes metrics of the board, see `metrics`.
+
+        Parameters
+        ----------
+        nb : Neighborhood
+            The neighborhood the agents moved by in the last step.
+        step : int or None
+            The step whose due metrics are computed. If None (default), all
+            enabled metrics are computed.
+        names : list of str or None
+            The metrics to compute regardless of the schedule, overriding
+            step.
+
+        Returns
+        -------
+        record : dict
+            See `MetricSchedule.evaluate()`.
+        """
+        if names is None:
+            if step is None:
+                names = [name for name in self.metrics.names
+                         if self.metrics.every(name)]
+            else:
+                names = self.metrics.due(step)
+        return self.metrics.evaluate(self, nb, names)
+
+    def zone_matrix(self, nb, key):
+        """
+        Returns the adjacency matrix of a neighborhood named by `key`, one of
+        FIEDLER_KEYS.
+        """
+        a_r, a_o, a_a, a_k = self.adjacencies(nb)
+        if key == 'attraction':
+            return a_a
+        elif key == 'orientation':
+            return a_o
+        elif key == 'repulsion':
+            return a_r
+        elif key == 'nearest':
+            return a_k
+        elif key == 'combined':
+            return a_a + a_o + a_r
+        raise ValueError('Unknown adjacency %r' % key)
+
+    def fiedler_value(self, nb, key):
+        """
+        Computes the Fiedler eigenvalue of the adjacency matrix `key` of a
+        neighborhood, see `zone_matrix()`.
+        """
+        return self.get_fied(self.laplacian(self.zone_matrix(nb, key)), key)
+
+    def fiedler_values(self, nb):
+        """
+        Computes the Fiedler eigenvalues of a neighborhood.
+
+        Parameters
+        ----------
+        nb : Neighborhood
+
+        Returns
+        -------
+        fiedler : tuple
+            The values in the order of FIEDLER_KEYS.
+        """
+        return tuple(self.fiedler_value(nb, key) for key in FIEDLER_KEYS)
+
+    def connected(self, nb):
+        """
+        Returns True if the combined zone graph of a neighborhood is
+        connected.
+        """
+        return self.is_connected(self.laplacian(self.zone_matrix(
+            nb, 'combined')))
+
+    def order_parameters(self, nb=None):
+        """
+        Computes the order parameters of the current state, see
+        `order.order_parameters()`, with clusters defined by the radius of
+        attraction.
+        """
+        return order.order_parameters(self.state.pos, self.state.ori,
+                                      self.ra, self.search)
+
+    def simulate(self, t=None, callback=None):
+        """
+        Runs the simulation without any plotting, as fast as the dynamics
+        allow. Only the metrics due at each step are computed, see
+        `metrics`.
+
+        Parameters
+        ----------
+        t : int or None
+            The number of time steps to simulate, defaults to `self.t`.
+        callback : function : board, i, record -> None
+            Called after each step i (counted from the board's first step)
+            with the metrics computed at that step, possibly none. Useful to
+            record the state of the board as it evolves.
+
+        Returns
+        -------
+        records : pandas.DataFrame
+            The metrics indexed by time step, for the steps where any were
+            computed, with NaN for metrics that were not due.
+        """
+        if t is None:
+            t = self.t
+        steps = []
+        records = []
+        for _ in range(t):
+            i = self.time
+            record = self.measure(self.step(), i)
+            self.record = record
+            if record:
+                steps.append(i)
+                records.append(record)
+            if callback is not None:
+                callback(self, i, record)
+        return pd.DataFrame(records, index=steps)
+
+    def batch_directions(self, nb):
+        """
+        Computes the desired directions of all agents that have a batched
+        kernel.
+
+        As their per-agent dynamics do, this also sets the speed and maximum
+        turning angle of predators and prey for the step, and kills the prey
+        caught by a predator, see `PreyAgent`.
+
+        Parameters
+        ----------
+        nb : Neighborhood
+            The neighborhood at the current time step.
+
+        Returns
+        -------
+        batched : numpy.ndarray
+            A length n boolean array, True for agents that were batched.
+        d : numpy.ndarray
+            An nx2 array of desired directions, valid where batched is True.
+        """
+        rules = np.array([kernels.batch_rule(agent) for agent in self.agents])
+        std = np.array([getattr(agent, 'noise_std', 0)
+                        for agent in self.agents])
+        noise = self.noise * std[:, np.newaxis]
+        st = self.state
+        pos = st.pos
+        ori = st.ori
+
+        d = np.zeros((self.n, 2))
+        zones = rules == 'zones'
+        if zones.any():
+            i, j, labels = nb.edges()
+            d[zones] = kernels.zone_directions(i, j, labels, pos, ori,
+                                               noise)[zones]
+        nearest = rules == 'nearest'
+        if nearest.any():
+            i, j, labels = kernels.nearest_edges(pos, nb.nearest, self.rr,
+                                                 self.ro)
+            d[nearest] = kernels.zone_directions(i, j, labels, pos, ori,
+                                                 noise)[nearest]
+        chase = rules == 'chase'
+        if chase.any():
+            rows = np.nonzero(chase)[0]
+            agents = [self.agents[r] for r in rows]
+            d[rows], starved = kernels.chase_directions(
+                pos, st.kind, rows, [a.desist_r for a in agents],
+                [a.desist_num for a in agents], [a.pred_r for a in agents])
+            params = self.kinds[PREDATOR]
+            st.speed[rows] = np.where(starved, 0, params['speed'])
+            st.thetamax[rows] = np.where(starved, 0, params['thetamax'])
+        prey = rules == 'prey'
+        if prey.any():
+            d[prey] = self.prey_directions(nb, prey, noise)[prey]
+        return zones | nearest | chase | prey, d
+
+    def prey_directions(self, nb, prey, noise):
+        """
+        Computes the desired directions of prey, as
+        `PreyAgent.get_desired_direction()` does, and sets their speeds and
+        maximum turning angles. See `batch_directions()`.
+
+        Only the predators and dead agents are looked up in the neighbor
+        search, so the cost grows with the number of threats rather than
+        the number of prey.
+
+        Parameters
+        ----------
+        nb : Neighborhood
+        prey : numpy.ndarray
+            A length n boolean array, True for the prey to update.
+        noise : numpy.ndarray
+            An nx2 array of scaled noise vectors.
+
+        Returns
+        -------
+        d : numpy.ndarray
+            An nx2 array of desired directions, valid where prey is True.
+        """
+        st = self.state
+        pos = st.pos
+        kind = st.kind
+        dead = prey & (kind == DEAD)
+        prey = prey & ~dead
+        rows = np.nonzero(prey)[0]
+        params = {}
+        for name in ('pred_kill', 'pred_repulsion', 'dead_repulsion',
+                     'flee_speed'):
+            params[name] = np.zeros(self.n)
+            params[name][rows] = [getattr(self.agents[r], name)
+                                  for r in rows]
+
+        # Prey only school with other prey
+        i, j, labels = nb.edges()
+        keep = kind[j] == PREY
+        base = kernels.zone_directions(i[keep], j[keep], labels[keep], pos,
+                                       st.ori, noise)
+
+        threats = np.nonzero((kind == PREDATOR) | (kind == DEAD))[0]
+        reach = max(params['pred_kill'].max(),
+                    params['pred_repulsion'].max(),
+                    params['dead_repulsion'].max())
+        t, p = self.index.candidates(reach + 2 * self.drift, threats)
+        keep = prey[p]
+        killed, fleeing, evading, d_p, d_d = kernels.threat_directions(
+            p[keep], t[keep], pos, kind, params['pred_kill'],
+            params['pred_repulsion'], params['dead_repulsion'])
+
+        d = np.where(fleeing[:, np.newaxis], kernels.unit(d_p + base),
+                     np.where(evading[:, np.newaxis],
+                              kernels.unit(d_d + base), base))
+        speed = self.kinds[PREY]['speed']
+        st.speed[rows] = np.where(fleeing, params['flee_speed'],
+                                  speed)[rows]
+        st.thetamax[rows] = self.kinds[PREY]['thetamax']
+
+        # Caught and dead prey keep their heading
+        killed &= prey
+        d[killed | dead] = st.ori[killed | dead]
+        for r in np.nonzero(killed)[0]:
+            self.agents[r].kill()
+        return d
+
+    def batch_move(self, nb, target=None):
+        """
+        Turns and moves all agents that have a batched kernel in one pass.
 
-    def run(self, saveloc=None):
+        Parameters
+        ----------
+        nb : Neighborhood
+            The neighborhood at the current time step.
+        target : AgentState or None
+            The state to write the new positions and orientations into, or
+            None (default) for the board's state.
+        """
+        batched, d = self.batch_directions(nb)
+        st = self.state
+        if target is None:
+            target = st
+        pos, ori = kernels.turn(st.pos[batched], st.ori[batched], d[batched],
+                                st.speed[batched], st.thetamax[batched])
+        if self.index.spatial and batched.any():
+            step = np.sqrt(((pos - st.pos[batched]) ** 2).sum(axis=1))
+            self.drift = max(self.drift, step.max())
+        target.pos[batched] = pos
+        target.ori[batched] = ori
+
+    def run(self, saveloc=None, frame_time=0.05, ffmpeg=None):
         """
         Runs the simulation.
 
+        The live view only redraws the agents and the Fiedler eigenvalues
+        (blitting them over a cached background) and keeps the axes fixed
+        until the agents or the eigenvalues leave them. The simulation does
+        not wait for the display: each frame shows the latest state after
+        stepping for up to `frame_time` seconds, so frames are dropped when
+        drawing cannot keep up. Every step still enters the Fiedler plot.
+
         Parameters
         ----------
         saveloc : str
             The video will be saved in <saveloc>/animation.mp4 (directory
             created as needed), and the first and last frame will be saved
             in <saveloc>/first.png and <saveloc>/last.png respectively.
+            Every step is a frame of the video. For long runs, recording
+            the run and rendering it with `render.render()` is faster.
+        frame_time : number
+            The time in seconds the live view simulates between frames,
+            defaults to 0.05. At least one step is taken per frame.
+        ffmpeg : str or None
+            The ffmpeg executable used to save the video, or None (default)
+            for matplotlib's setting.
         """
+        import matplotlib.pyplot as plt
+        from matplotlib import animation
+        from matplotlib.collections import LineCollection
+
         fig = plt.figure(figsize=(32, 6))
         ax1 = plt.subplot2grid((1, 4), (0, 0), aspect='equal')
         ax2 = plt.subplot2grid((1, 4), (0, 1), colspan=2)
@@ -87,134 +521,167 @@ class CouzinBoard(Board):
                              transform=ax1.transAxes)
         ax1.set_title('Agent Positions and Orientations')
         ax2.set_title('Fiedler Eigenvalues')
-
-        # ax1.tick_params(axis='x', labelbottom='off')
-        # ax1.tick_params(axis='y', labelleft='off')
-
+        ax1.grid(True)
+        ax2.grid(True)
         ax2.set_xlim((1, self.t))
-        # ax2.set_ylim((0, 10))
-
-        xs = [agent.p.x for agent in self.agents]
-        ys = [agent.p.y for agent in self.agents]
+        ax2.set_ylim((0, 1))
 
-        colors = [agent.color for agent in self.agents]
-
-        scat = ax1.scatter(xs, ys, c=colors, s=50)
-
-        plots = []
-        for agent in self.agents:
-            p = agent.p
-            o = agent.o
-            plot, = ax1.plot([p.x, p.x + o.x], [p.y, p.y + o.y], 'k')
-            plots.append(plot)
+        pos = self.state.pos
+        scat = ax1.scatter(pos[:, 0], pos[:, 1],
+                           c=[agent.color for agent in self.agents], s=50)
+        headings = LineCollection([], colors='k')
+        ax1.add_collection(headings)
 
         # Setup plots for fiedler eigenvalues and their averages
-        aplot = FiedlerPlot(ax2, 'Attraction', 'g')
-        oplot = FiedlerPlot(ax2, 'Orientation', 'b')
-        rplot = FiedlerPlot(ax2, 'Repulsion', 'r')
-        lplot = FiedlerPlot(ax2, 'Attr + Or + Rep', 'c')
-        kplot = FiedlerPlot(ax2, 'K Nearest', 'm')
-
-        if saveloc is not None and not os.path.exists(saveloc):
-            os.makedirs(saveloc)
-
-        def update_fig(i):
-            # Update time text
-            print 'Running frame ', i
-            time_text.set_text('t = %i' % (i + 1))
-
-            # Update Agent positions
+        aplot = FiedlerPlot(ax2, 'Attraction', 'g', self.t)
+        oplot = FiedlerPlot(ax2, 'Orientation', 'b', self.t)
+        rplot = FiedlerPlot(ax2, 'Repulsion', 'r', self.t)
+        lplot = FiedlerPlot(ax2, 'Attr + Or + Rep', 'c', self.t)
+        kplot = FiedlerPlot(ax2, 'K Nearest', 'm', self.t)
+        fplots = [aplot, oplot, rplot, kplot, lplot]
+        ax2.legend(loc=3, ncol=1, bbox_to_anchor=(1.05, 0))
+        av_text = ax2.text(0.02, 0.95, '', transform=ax2.transAxes)
+
+        artists = [time_text, scat, headings, av_text]
+        for plot in fplots:
+            artists.extend(plot.artists())
+
+        def step(i):
             fa, fo, fr, fk, fl = self.update()
-            xs = [agent.p.x for agent in self.agents]
-            ys = [agent.p.y for agent in self.agents]
-            data = np.array([xs, ys]).transpose()
-            scat.set_offsets(data)
-            colors = [agent.color for agent in self.agents]
-            scat.set_color(colors)
-
-            # Update Agent Orientations
-            for j in range(len(plots)):
-                agent = self.agents[j]
-                p = agent.p
-                o = agent.o
-                plot = plots[j]
-                plot.set_data([p.x, p.x + o.x], [p.y, p.y + o.y])
-
-            # Update axes
-            minxs = min(xs) - 1
-            minys = min(ys) - 1
-            maxxs = max(xs) + 1
-            maxys = max(ys) + 1
-            xlen = maxxs - minxs
-            ylen = maxys - minys
-            length = max(xlen, ylen)
-            ax1.set_xlim((minxs, minxs + length))
-            ax1.set_ylim((minys, minys + length))
-
-            if length < 20:
-                ticksize = 2
-            elif length < 50:
-                ticksize = 5
-            else:
-                ticksize = 10
-
-            ax1.set_xticks(np.arange(math.ceil(minxs),
-                                     math.ceil(minxs + length), ticksize))
-            ax1.set_yticks(np.arange(math.ceil(minys),
-                                     math.ceil(minys + length), ticksize))
-            ax1.grid(True)
-
-            # Update fiedler eigenvalues plot
-            ma = aplot.update(i, fa)
-            mo = oplot.update(i, fo)
-            mr = rplot.update(i, fr)
-            ml = lplot.update(i, fl)
-            mk = kplot.update(i, fk)
-            ax2.legend(loc=3, ncol=1, bbox_to_anchor=(1.05, 0))
-
-            maxy = max(ma, mo, mr, ml, mk)
-            maxyc = math.ceil(maxy)
-            if maxyc - maxy < 0.2:
-                maxyc += 1
-            ax2.set_ylim((0, maxyc))
-            ax2.grid(True)
-
-            if saveloc:
-                if i == 0:
-                    plt.savefig('%s/first.png' % saveloc)
-                if i == self.t - 1:
-                    plt.savefig('%s/last.png' % saveloc)
-            return ax1, ax2, scat, plots[0]
-
-        ani = animation.FuncAnimation(fig, update_fig, frames=self.t,
-                                      repeat=False, interval=10)
-
-        if saveloc:
+            for plot, f in zip(fplots, (fa, fo, fr, fk, fl)):
+                # Metrics disabled in the schedule are not plotted
+                if f is not None:
+                    plot.update(i, f)
+
+        def update_artists(i):
+            # Returns True if the axes had to be rescaled
+            time_text.set_text('t = %i' % (i + 1))
+            pos = self.state.pos
+            scat.set_offsets(pos)
+            scat.set_color([agent.color for agent in self.agents])
+            headings.set_segments(np.stack([pos, pos + self.state.ori],
+                                           axis=1))
+            av_text.set_text('Averages: ' + ', '.join(
+                '%s %.2f' % (plot.prefix, plot.average) for plot in fplots))
+
+            rescaled = False
+            lo = pos.min(axis=0) - 1
+            hi = pos.max(axis=0) + 1
+            length = (hi - lo).max()
+            (x0, x1), (y0, y1) = ax1.get_xlim(), ax1.get_ylim()
+            if lo[0] < x0 or lo[1] < y0 or hi[0] > x1 or hi[1] > y1 or \
+                    4 * length < x1 - x0:
+                # Leave a margin so the view does not change every frame
+                margin = 0.25 * length
+                ax1.set_xlim((lo[0] - margin, lo[0] + length + margin))
+                ax1.set_ylim((lo[1] - margin, lo[1] + length + margin))
+                rescaled = True
+
+            maxy = max(plot.max for plot in fplots)
+            if maxy > ax2.get_ylim()[1]:
+                maxyc = math.ceil(maxy * 1.25)
+                if maxyc - maxy < 0.2:
+                    maxyc += 1
+                ax2.set_ylim((0, maxyc))
+                rescaled = True
+            return rescaled
+
+        if saveloc is not None:
+            if not os.path.exists(saveloc):
+                os.makedirs(saveloc)
+            if ffmpeg is not None:
+                plt.rcParams['animation.ffmpeg_path'] = ffmpeg
             writer = animation.FFMpegWriter(fps=15, bitrate=4096)
-            plt.rcParams['animation.ffmpeg_path'] = 'c:/python27/Lib/ffmpeg/bin/ffmpeg.exe'
-            ani.save('%s/animation.mp4' % saveloc, writer=writer)
+            with writer.saving(fig, '%s/animation.mp4' % saveloc,
+                               fig.dpi):
+                for i in range(self.t):
+                    step(i)
+                    update_artists(i)
+                    writer.grab_frame()
+                    if i == 0:
+                        plt.savefig('%s/first.png' % saveloc)
+                    if i == self.t - 1:
+                        plt.savefig('%s/last.png' % saveloc)
             plt.close()
-        else:
-            plt.show()
+            return
+
+        for artist in artists:
+            artist.set_animated(True)
+        plt.show(block=False)
+        canvas = fig.canvas
+        backgrounds = []
+
+        def redraw():
+            # Draw the static parts once and cache them for blitting
+            canvas.draw()
+            backgrounds[:] = [canvas.copy_from_bbox(fig.bbox)]
+            blit()
+
+        def blit():
+            canvas.restore_region(backgrounds[0])
+            for artist in artists:
+                fig.draw_artist(artist)
+            canvas.blit(fig.bbox)
+            canvas.flush_events()
+
+        update_artists(-1)
+        redraw()
+        i = 0
+        while i < self.t and plt.fignum_exists(fig.number):
+            start = time.time()
+            step(i)
+            i += 1
+            while i < self.t and time.time() - start < frame_time:
+                step(i)
+                i += 1
+            if update_artists(i - 1):
+                redraw()
+            else:
+                blit()
+        for artist in artists:
+            artist.set_animated(False)
+        plt.show()
 
 
 class FiedlerPlot:
     """
     Utility class to aid in plotting fiedler eigenvalues.
+
+    The values are kept in a preallocated array and their average as a
+    running sum, so each update takes constant time besides handing the
+    data to the plot.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+    prefix : str
+        The name of the eigenvalue in the legend.
+    color : str
+    capacity : int
+        The number of time steps that will be plotted.
     """
 
     fied_name_fmt = '%s: Fiedler Eigenvalues'
-    av_name_fmt = '%s: Average Fiedler Eigenvalue (%.2f)'
+    av_name_fmt = '%s: Average Fiedler Eigenvalue'
 
-    def __init__(self, ax, prefix, color):
+    def __init__(self, ax, prefix, color, capacity):
         self.prefix = prefix
-        self.ex = []  # x values for fiedler eigenvalue plot
-        self.ey = []  # y values for fiedler eigenvalue plot
-        self.ax = []  # x values for average fiedler eigenvalue plot
-        self.eplot, = ax.plot(self.ex, self.ey, color=color, marker='+',
+        self.ex = np.zeros(capacity)  # steps the eigenvalues were taken at
+        self.ey = np.zeros(capacity)  # y values for eigenvalues
+        self.count = 0
+        self.total = 0.0
+        self.average = 0.0
+        self.max = 0.0
+        self.eplot, = ax.plot([], [], color=color, marker='+',
                               label=self.fied_name_fmt % self.prefix)
-        self.aplot, = ax.plot(self.ax, [], color=color,
-                              label=self.av_name_fmt % (self.prefix, 0))
+        self.aplot, = ax.plot([], [], color=color,
+                              label=self.av_name_fmt % self.prefix)
+
+    def artists(self):
+        """
+        Returns the artists drawn by this plot.
+        """
+        return self.eplot, self.aplot
 
     def update(self, i, feig):
         """
@@ -232,13 +699,15 @@ class FiedlerPlot:
         mx : number
             The current maximum.
         """
-
-        self.ex.append(i + 1)
-        self.ax.append(i + 1)
-        self.ey.append(feig)
-        av = sum(self.ey) / float(len(self.ey))
-        self.eplot.set_data(self.ex, self.ey)
-        self.aplot.set_data(self.ax, av)
-        self.aplot.set_label(self.av_name_fmt % (self.prefix, av))
-
-        return max(self.ey)
+        feig = float(np.real(feig))
+        # Metrics sampled every k steps are plotted at the steps they were
+        # taken at
+        self.ex[self.count] = i + 1
+        self.ey[self.count] = feig
+        self.count += 1
+        self.total += feig
+        self.average = self.total / self.count
+        self.max = max(self.max, feig)
+        self.eplot.set_data(self.ex[:self.count], self.ey[:self.count])
+        self.aplot.set_data([1, i + 1], [self.average, self.average])
+        return self.max
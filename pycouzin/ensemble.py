@@ -0,0 +1,211 @@
+import numpy as np
+from numpy import linalg as la
+
+from pycouzin import rng
+from pycouzin.neighborhood import rank_nearest
+
+
+class EnsembleBoard:
+    """
+    Many independent replicates of a board, held in stacked arrays so that
+    adjacency matrices, laplacians and connectivity are computed for the
+    whole ensemble in a few batched NumPy calls.
+
+    This suits sweeps over small boards, where building one `Board` per
+    replicate is dominated by Python overhead. Every matrix gains a leading
+    replicate axis, e.g. adjacency matrices and laplacians are R x n x n.
+
+    Parameters
+    ----------
+    reps : int
+        The number of replicates R.
+    n : int
+        The number of agents per replicate.
+    m : number
+        Defines the size of the board. x & y will range from -m to m.
+    seed : None, int or numpy.random.SeedSequence
+        The root seed. Replicate r draws its agents from child seed r of
+        `rng.spawn(seed, reps)` exactly as a `Board` of plain agents seeded
+        with that child would, so the two give the same positions. Defaults
+        to None, which draws fresh OS entropy.
+    pos : numpy.ndarray or None
+        An R x n x 2 array of positions to use instead of random ones, in
+        which case the orientations are left at zero.
+
+    Attributes
+    ----------
+    pos : numpy.ndarray
+        The R x n x 2 agent positions.
+    ori : numpy.ndarray
+        The R x n x 2 agent orientations.
+    """
+
+    def __init__(self, reps, n, m, seed=None, pos=None):
+        self.reps = reps
+        self.n = n
+        self.m = m
+        if pos is not None:
+            self.pos = np.array(pos, dtype=float).reshape(reps, n, 2)
+            self.ori = np.zeros((reps, n, 2))
+            return
+
+        # Each agent draws its position, then the orientation it normalizes
+        u = np.array([rng.make_rng(s).uniform(-m, m, (n, 4))
+                      for s in rng.spawn(seed, reps)]).reshape(reps, n, 4)
+        self.pos = u[:, :, :2].copy()
+        o = u[:, :, 2:]
+        l = np.sqrt(o[:, :, 0] ** 2 + o[:, :, 1] ** 2)
+        self.ori = o / l[:, :, np.newaxis]
+
+    def distances(self):
+        """
+        Computes the distances between all pairs of agents of each replicate.
+
+        Returns
+        -------
+        d : numpy.ndarray
+            An R x n x n array, see `neighborhood.pairwise_distances()`.
+        """
+        x = self.pos[:, :, 0]
+        y = self.pos[:, :, 1]
+        dx = x[:, np.newaxis, :] - x[:, :, np.newaxis]
+        dy = y[:, np.newaxis, :] - y[:, :, np.newaxis]
+        return np.sqrt(dx ** 2 + dy ** 2)
+
+    def radius_adjacency(self, max_radius, min_radius=0):
+        """
+        Returns the adjacency matrices where agents i and j are adjacent if
+        the distance d is between min_radius (inclusive) and max_radius
+        (exclusive). See `Board.radius_adjacency()`.
+
+        Parameters
+        ----------
+        max_radius : number
+        min_radius : number
+            Defaults to 0.
+
+        Returns
+        -------
+        A : numpy.ndarray
+            An R x n x n array.
+        """
+        d = self.distances()
+        a = ((d < max_radius) & (d >= min_radius)).astype(float)
+        idx = np.arange(self.n)
+        a[:, idx, idx] = 0
+        return a
+
+    def nearest_adjacency(self, max_k, min_k=0, bidirectional=False):
+        """
+        Returns the adjacency matrices where i is connected to j if i is one
+        of j's k nearest neighbors. See `Board.nearest_adjacency()`.
+
+        Parameters
+        ----------
+        max_k : int
+        min_k : int
+            The min_k nearest neighbors are excluded, defaults to 0.
+        bidirectional : boolean
+            If True, the matrices are made symmetric, see
+            `neighborhood.nearest_matrix()`. Defaults to False.
+
+        Returns
+        -------
+        A : numpy.ndarray
+            An R x n x n array.
+        """
+        d = self.distances()
+        idx = np.arange(self.n)
+        d[:, idx, idx] = np.inf
+        nearest = rank_nearest(d.reshape(-1, self.n), max_k, min_k)
+        k = nearest.shape[1]
+        r = np.repeat(np.arange(self.reps), self.n * k)
+        cols = np.tile(np.repeat(idx, k), self.reps)
+        a = np.zeros((self.reps, self.n, self.n))
+        a[r, nearest.ravel(), cols] = 1
+        if bidirectional:
+            a = np.maximum(a, a.transpose(0, 2, 1))
+        return a
+
+    def laplacian(self, adjacency):
+        """
+        Computes the laplacian of each adjacency matrix, using the row sums
+        as the diagonal. See `graph.laplacian()`.
+
+        Parameters
+        ----------
+        adjacency : numpy.ndarray
+            An R x n x n array.
+
+        Returns
+        -------
+        laplacian : numpy.ndarray
+            An R x n x n array.
+        """
+        l = -adjacency
+        idx = np.arange(self.n)
+        l[:, idx, idx] = adjacency.sum(axis=2)
+        return l
+
+    def get_fied(self, laplacian):
+        """
+        Computes the Fiedler eigenvalue of every laplacian with one stacked
+        eigenvalue solve: `eigvalsh` when all of them are symmetric, `eig`
+        otherwise.
+
+        Parameters
+        ----------
+        laplacian : numpy.ndarray
+            An R x n x n array.
+
+        Returns
+        -------
+        fied : numpy.ndarray
+            A length R array, complex only if some asymmetric laplacian has
+            complex eigenvalues.
+        """
+        if np.array_equal(laplacian, laplacian.transpose(0, 2, 1)):
+            return la.eigvalsh(laplacian)[:, 1]
+        w = la.eigvals(laplacian)
+        w = np.sort(w, axis=1)
+        if not np.iscomplexobj(w) or not np.any(np.imag(w)):
+            w = np.real(w)
+        return w[:, 1]
+
+    def is_connected(self, laplacian, tolerance=0.00001, method='graph'):
+        """
+        Tests every replicate for connectivity. See `Board.is_connected()`.
+
+        Parameters
+        ----------
+        laplacian : numpy.ndarray
+            An R x n x n array of laplacians or adjacency matrices.
+        tolerance : number
+            The tolerance at which to check the Fiedler eigenvalue, only used
+            by the spectral method.
+        method : str
+            'graph' (default) computes the reachability of every pair of
+            agents by repeatedly squaring the stacked adjacency matrices,
+            which is exact. The graph is connected if some agent is reached
+            from every agent, i.e. if it has a single closed strongly
+            connected component. 'spectral' thresholds the Fiedler
+            eigenvalue.
+
+        Returns
+        -------
+        connected : numpy.ndarray
+            A length R boolean array.
+        """
+        if method == 'spectral':
+            return np.real(self.get_fied(laplacian)) > tolerance
+        elif method != 'graph':
+            raise ValueError('Unknown connectivity method %r' % method)
+
+        reach = (laplacian != 0).astype(float)
+        idx = np.arange(self.n)
+        reach[:, idx, idx] = 1
+        steps = 1
+        while steps < self.n - 1:
+            reach = (np.matmul(reach, reach) > 0).astype(float)
+            steps *= 2
+        return reach.all(axis=1).any(axis=1)
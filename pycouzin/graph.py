@@ -0,0 +1,256 @@
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.sparse import csgraph
+except ImportError:
+    sparse = None
+    csgraph = None
+
+
+def issparse(a):
+    """
+    Returns True if `a` is a SciPy sparse matrix.
+    """
+    return sparse is not None and sparse.issparse(a)
+
+
+def adjacency_matrix(i, j, n, as_sparse=False):
+    """
+    Builds an nxn adjacency matrix with a_ij = 1 for every pair (i, j).
+
+    Parameters
+    ----------
+    i : numpy.ndarray
+    j : numpy.ndarray
+    n : int
+    as_sparse : boolean
+        If True, returns a `scipy.sparse.csc_matrix` so that the neighbors of
+        an agent (the non-zero entries of its column) can be read without
+        scanning every row. Defaults to False.
+
+    Returns
+    -------
+    A : numpy.ndarray or scipy.sparse.csc_matrix
+    """
+    if as_sparse:
+        if sparse is None:
+            raise ImportError('Sparse adjacency matrices require scipy')
+        a = sparse.csc_matrix((np.ones(len(i)), (i, j)), shape=(n, n))
+        a.sum_duplicates()
+        a.data[:] = 1
+        return a
+    a = np.zeros((n, n))
+    a[i, j] = 1
+    return a
+
+
+def symmetrize(a):
+    """
+    Returns the element-wise maximum of `a` and its transpose.
+    """
+    if issparse(a):
+        return a.maximum(a.T).tocsc()
+    return np.maximum(a, a.T)
+
+
+def column_neighbors(a, i):
+    """
+    Returns the indices j where a_ji is non-zero, i.e. the agents adjacent
+    to agent i.
+
+    Parameters
+    ----------
+    a : numpy.ndarray or scipy.sparse matrix
+    i : int
+
+    Returns
+    -------
+    neighbors : numpy.ndarray
+        The indices in increasing order.
+    """
+    if issparse(a):
+        col = a.getcol(i).tocsc()
+        col.eliminate_zeros()
+        return np.sort(col.indices)
+    return np.nonzero(a[:, i])[0]
+
+
+def laplacian(a):
+    """
+    Computes the laplacian of the adjacency matrix `a`, using the row sums
+    as the diagonal. Sparse input gives sparse output.
+
+    Parameters
+    ----------
+    a : numpy.ndarray or scipy.sparse matrix
+
+    Returns
+    -------
+    laplacian : numpy.ndarray or scipy.sparse.csc_matrix
+    """
+    s = np.asarray(a.sum(axis=1)).ravel()
+    if issparse(a):
+        l = -a.tocsc()
+        return (l - sparse.diags(l.diagonal()) + sparse.diags(s)).tocsc()
+    l = -a
+    np.fill_diagonal(l, s)
+    return l
+
+
+def off_diagonal_count(a):
+    """
+    Returns the number of non-zero entries of `a` off its diagonal.
+    """
+    if issparse(a):
+        a = a.tocsc()
+        a.eliminate_zeros()
+        return a.nnz - np.count_nonzero(a.diagonal())
+    return np.count_nonzero(a) - np.count_nonzero(np.diag(a))
+
+
+def edges(a):
+    """
+    Returns the off-diagonal non-zero entries of `a` as directed edges.
+    Works for adjacency matrices and laplacians alike.
+
+    Parameters
+    ----------
+    a : numpy.ndarray or scipy.sparse matrix
+
+    Returns
+    -------
+    i : numpy.ndarray
+    j : numpy.ndarray
+        a_ij != 0 and i != j for every edge (i, j).
+    """
+    if issparse(a):
+        a = a.tocoo()
+        keep = (a.data != 0) & (a.row != a.col)
+        return a.row[keep], a.col[keep]
+    i, j = np.nonzero(a)
+    keep = i != j
+    return i[keep], j[keep]
+
+
+def components(a, connection='weak'):
+    """
+    Labels the connected components of the graph with an edge i -> j for
+    every off-diagonal non-zero a_ij.
+
+    Parameters
+    ----------
+    a : numpy.ndarray or scipy.sparse matrix
+        An adjacency matrix or laplacian.
+    connection : str
+        'weak' (default) ignores edge directions, 'strong' finds the
+        strongly connected components.
+
+    Returns
+    -------
+    count : int
+        The number of components.
+    labels : numpy.ndarray
+        The component of each node, numbered from 0.
+    """
+    n = a.shape[0]
+    i, j = edges(a)
+    if csgraph is not None:
+        g = sparse.csr_matrix((np.ones(len(i)), (i, j)), shape=(n, n))
+        return csgraph.connected_components(g, directed=True,
+                                            connection=connection)
+    if connection == 'weak':
+        i, j = np.concatenate([i, j]), np.concatenate([j, i])
+    return _strong_components(n, i, j)
+
+
+def _adjacency_lists(n, i, j):
+    order = np.argsort(i, kind='mergesort')
+    starts = np.searchsorted(i[order], np.arange(n + 1))
+    targets = j[order]
+    return [targets[starts[k]:starts[k + 1]].tolist() for k in range(n)]
+
+
+def _strong_components(n, i, j):
+    """
+    Kosaraju's algorithm with explicit stacks, for when SciPy is missing.
+    """
+    forward = _adjacency_lists(n, i, j)
+    backward = _adjacency_lists(n, j, i)
+
+    # First pass: order the nodes by depth first search finishing time
+    seen = [False] * n
+    finished = []
+    for root in range(n):
+        if seen[root]:
+            continue
+        seen[root] = True
+        stack = [(root, iter(forward[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if not seen[child]:
+                    seen[child] = True
+                    stack.append((child, iter(forward[child])))
+                    break
+            else:
+                stack.pop()
+                finished.append(node)
+
+    # Second pass: search the reversed graph in reverse finishing order
+    labels = np.full(n, -1, dtype=int)
+    count = 0
+    for root in reversed(finished):
+        if labels[root] != -1:
+            continue
+        labels[root] = count
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in backward[node]:
+                if labels[child] == -1:
+                    labels[child] = count
+                    stack.append(child)
+        count += 1
+    return count, labels
+
+
+def component_sizes(a):
+    """
+    Returns the number of nodes in each weakly connected component of `a`,
+    largest first.
+
+    Parameters
+    ----------
+    a : numpy.ndarray or scipy.sparse matrix
+        An adjacency matrix or laplacian.
+
+    Returns
+    -------
+    sizes : numpy.ndarray
+    """
+    count, labels = components(a)
+    return np.sort(np.bincount(labels, minlength=count))[::-1]
+
+
+def closed_components(l):
+    """
+    Counts the strongly connected components of `l` that have no edges
+    leaving them. For a laplacian with the row sums on its diagonal this is
+    the multiplicity of its zero eigenvalue, so the graph is connected (has
+    a spanning tree) if and only if the count is 1. For symmetric matrices
+    it is simply the number of connected components.
+
+    Parameters
+    ----------
+    l : numpy.ndarray or scipy.sparse matrix
+        A laplacian or adjacency matrix.
+
+    Returns
+    -------
+    count : int
+    """
+    count, labels = components(l, 'strong')
+    i, j = edges(l)
+    leaving = labels[i] != labels[j]
+    return count - len(np.unique(labels[i][leaving]))
@@ -0,0 +1,309 @@
+import numpy as np
+
+from pycouzin.neighborhood import REPULSION, ORIENTATION, ATTRACTION
+from pycouzin.state import PREY, PREDATOR, DEAD
+
+
+# Overriding any of these opts a subclass out of its parent's batch rule
+DYNAMICS_METHODS = ('update', 'move', 'reg_ang_v', 'get_desired_direction',
+                    'get_direction_from_zones', 'get_adjacent_agents')
+
+_rules = {}
+
+
+def batch_rule(agent):
+    """
+    Returns the name of the batched kernel that reproduces the dynamics of
+    `agent`, or None if it must be updated on its own.
+
+    A class opts in by setting a `batch_rule` attribute. A subclass that
+    overrides any of the dynamics methods without setting `batch_rule`
+    itself falls back to the per-agent path.
+
+    Parameters
+    ----------
+    agent : Agent
+
+    Returns
+    -------
+    rule : str or None
+    """
+    cls = type(agent)
+    if cls not in _rules:
+        _rules[cls] = None
+        for klass in cls.__mro__:
+            attrs = vars(klass)
+            if 'batch_rule' in attrs:
+                _rules[cls] = attrs['batch_rule']
+                break
+            if any(name in attrs for name in DYNAMICS_METHODS):
+                break
+    return _rules[cls]
+
+
+def unit(v):
+    """
+    Normalizes the rows of `v`, leaving zero rows at zero.
+
+    Parameters
+    ----------
+    v : numpy.ndarray
+        An nx2 array of vectors.
+
+    Returns
+    -------
+    u : numpy.ndarray
+    """
+    l = np.sqrt(v[:, 0] ** 2 + v[:, 1] ** 2)
+    u = np.zeros_like(v)
+    nz = l != 0
+    u[nz] = v[nz] / l[nz][:, np.newaxis]
+    return u
+
+
+def nearest_edges(pos, nearest, rr, ro):
+    """
+    Labels each agent's k nearest neighbors with the zone they fall in, as
+    `NearestAgent` does: repulsion within rr, orientation within ro and
+    attraction beyond.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    nearest : numpy.ndarray
+        An nxk array of neighbor indices, closest first.
+    rr : number
+    ro : number
+
+    Returns
+    -------
+    i : numpy.ndarray
+    j : numpy.ndarray
+    labels : numpy.ndarray
+        See `Neighborhood.edges()`.
+    """
+    n, k = nearest.shape
+    i = np.repeat(np.arange(n), k)
+    j = nearest.ravel()
+    dx = pos[j, 0] - pos[i, 0]
+    dy = pos[j, 1] - pos[i, 1]
+    d = np.sqrt(dx ** 2 + dy ** 2)
+    labels = np.full(len(i), ATTRACTION, dtype=np.int8)
+    labels[d < ro] = ORIENTATION
+    labels[d < rr] = REPULSION
+    return i, j, labels
+
+
+def zone_directions(i, j, labels, pos, ori, noise):
+    """
+    Computes the desired direction of every agent from the agents in its
+    zones, as `TopologicalAgent.get_direction_from_zones()` does: agents in
+    the zone of repulsion push it away and override the others; otherwise it
+    heads along the mean of the orientation and attraction terms. Noise is
+    added and the result normalized.
+
+    Parameters
+    ----------
+    i : numpy.ndarray
+    j : numpy.ndarray
+    labels : numpy.ndarray
+        Directed edges i -> j and their zone labels. Each agent's terms are
+        summed in the order its edges appear.
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    ori : numpy.ndarray
+        An nx2 array of orientations.
+    noise : numpy.ndarray
+        An nx2 array of noise vectors.
+
+    Returns
+    -------
+    d : numpy.ndarray
+        An nx2 array of unit desired directions (zero where the noisy
+        direction is zero).
+    """
+    n = pos.shape[0]
+    r = unit(pos[j] - pos[i])
+    o = unit(ori[j])
+
+    def zone_sum(zone, v):
+        mask = labels == zone
+        return np.column_stack([
+            np.bincount(i[mask], weights=v[mask, 0], minlength=n),
+            np.bincount(i[mask], weights=v[mask, 1], minlength=n)])
+
+    d_r = -zone_sum(REPULSION, r)
+    d_o = zone_sum(ORIENTATION, o)
+    d_a = zone_sum(ATTRACTION, r)
+    repelled = np.bincount(i[labels == REPULSION], minlength=n) > 0
+    d = np.where(repelled[:, np.newaxis], d_r, (d_o + d_a) * 0.5)
+    return unit(d + noise)
+
+
+def _unit_rows(v):
+    # Normalizes vectors along the last axis, leaving zero vectors at zero
+    l = np.sqrt((v ** 2).sum(axis=-1))
+    return v / np.where(l == 0, 1, l)[..., np.newaxis]
+
+
+def chase_directions(pos, kind, rows, desist_r, desist_num, pred_r,
+                     block=2 ** 20):
+    """
+    Computes the desired direction of predators, as
+    `PredatorAgent.get_desired_direction()` does: each heads for its nearest
+    prey, or for the prey as a whole when fewer than `desist_num` prey are
+    within `desist_r` while more than `desist_num` survive, and steers away
+    from the predators within `pred_r`.
+
+    Every predator is compared with every prey and predator, `block`
+    distances at a time, so memory stays bounded for large groups.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    kind : numpy.ndarray
+        A length n array of type codes, see `state.AgentState`.
+    rows : numpy.ndarray
+        The indices of the predators to compute directions for.
+    desist_r : number or numpy.ndarray
+    desist_num : number or numpy.ndarray
+    pred_r : number or numpy.ndarray
+        The parameters of each predator in `rows`.
+    block : int
+        The number of distances computed at once, defaults to 2 ** 20.
+
+    Returns
+    -------
+    d : numpy.ndarray
+        A len(rows) x 2 array of unit desired directions (zero where a
+        predator has no reason to turn).
+    starved : numpy.ndarray
+        A boolean array, True for predators that found no prey and should
+        stop.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    m = len(rows)
+    desist_r = np.broadcast_to(np.asarray(desist_r, dtype=float), (m,))
+    desist_num = np.broadcast_to(np.asarray(desist_num, dtype=float), (m,))
+    pred_r = np.broadcast_to(np.asarray(pred_r, dtype=float), (m,))
+    prey = pos[kind == PREY]
+    preds = pos[kind == PREDATOR]
+
+    d = np.zeros((m, 2))
+    size = max(block // max(len(prey), len(preds), 1), 1)
+    for lo in range(0, m, size):
+        sl = slice(lo, lo + size)
+        p = pos[rows[sl]][:, np.newaxis]
+
+        rel = preds[np.newaxis] - p
+        near = np.sqrt((rel ** 2).sum(axis=2)) <= pred_r[sl, np.newaxis]
+        d_o = unit(-(_unit_rows(rel) * near[:, :, np.newaxis]).sum(axis=1))
+        if len(prey) == 0:
+            d[sl] = d_o
+            continue
+
+        rel = prey[np.newaxis] - p
+        dist = np.sqrt((rel ** 2).sum(axis=2))
+        d_p = unit(_unit_rows(rel).sum(axis=1))
+        nearest = unit(rel[np.arange(len(dist)), dist.argmin(axis=1)])
+        in_desist = (dist <= desist_r[sl, np.newaxis]).sum(axis=1)
+        desist = (in_desist < desist_num[sl]) & (len(prey) > desist_num[sl])
+        target = np.where(desist[:, np.newaxis], d_p, nearest)
+        d[sl] = unit(target + d_o)
+    return d, np.full(m, len(prey) == 0)
+
+
+def threat_directions(i, j, pos, kind, pred_kill, pred_repulsion,
+                      dead_repulsion):
+    """
+    Finds the predators and dead agents each prey reacts to, as
+    `PreyAgent.get_desired_direction()` does: a predator within `pred_kill`
+    kills the prey, predators within `pred_repulsion` make it flee and dead
+    agents within `dead_repulsion` make it evade.
+
+    Parameters
+    ----------
+    i : numpy.ndarray
+    j : numpy.ndarray
+        Pairs of prey i and agents j that include every predator and dead
+        agent within reach of each prey.
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    kind : numpy.ndarray
+        A length n array of type codes, see `state.AgentState`.
+    pred_kill : numpy.ndarray
+    pred_repulsion : numpy.ndarray
+    dead_repulsion : numpy.ndarray
+        Length n arrays of the parameters of each prey.
+
+    Returns
+    -------
+    killed : numpy.ndarray
+    fleeing : numpy.ndarray
+    evading : numpy.ndarray
+        Length n boolean arrays.
+    d_p : numpy.ndarray
+    d_d : numpy.ndarray
+        nx2 arrays of the unit directions away from the predators and away
+        from the dead.
+    """
+    n = pos.shape[0]
+    rel = pos[j] - pos[i]
+    dist = np.sqrt(rel[:, 0] ** 2 + rel[:, 1] ** 2)
+    u = unit(rel)
+    pred = kind[j] == PREDATOR
+    kill = pred & (dist <= pred_kill[i])
+    flee = pred & (dist <= pred_repulsion[i])
+    evade = (kind[j] == DEAD) & (dist <= dead_repulsion[i])
+
+    def away(mask):
+        return unit(-np.column_stack([
+            np.bincount(i[mask], weights=u[mask, 0], minlength=n),
+            np.bincount(i[mask], weights=u[mask, 1], minlength=n)]))
+
+    return (np.bincount(i[kill], minlength=n) > 0,
+            np.bincount(i[flee], minlength=n) > 0,
+            np.bincount(i[evade], minlength=n) > 0,
+            away(flee), away(evade))
+
+
+def turn(pos, ori, d, speed, thetamax):
+    """
+    Turns every agent towards its desired direction, as far as its maximum
+    turning angle allows, and moves it forward, as
+    `TopologicalAgent.move()` does for a single agent.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    ori : numpy.ndarray
+        An nx2 array of current orientations.
+    d : numpy.ndarray
+        An nx2 array of desired directions.
+    speed : numpy.ndarray
+        A length n array of speeds.
+    thetamax : numpy.ndarray
+        A length n array of maximum turning angles.
+
+    Returns
+    -------
+    pos : numpy.ndarray
+        The new positions.
+    ori : numpy.ndarray
+        The new orientations: the desired direction where the turn is within
+        thetamax, else the current orientation turned by thetamax towards
+        it.
+    """
+    ang_curr = np.arctan2(ori[:, 1], ori[:, 0])
+    diff = np.arctan2(d[:, 1], d[:, 0]) - ang_curr
+    diff[diff > np.pi] -= 2 * np.pi
+    diff[diff < -np.pi] += 2 * np.pi
+
+    limited = np.abs(diff) > thetamax
+    ang = ang_curr + np.clip(diff, -thetamax, thetamax)
+    new_ori = np.where(limited[:, np.newaxis],
+                       np.column_stack([np.cos(ang), np.sin(ang)]), d)
+    return pos + new_ori * speed[:, np.newaxis], new_ori
@@ -3,6 +3,8 @@ from pycouzin.topological_agent import TopologicalAgent
 
 class NearestAgent (TopologicalAgent):
 
+    batch_rule = 'nearest'
+
     def get_desired_direction(self, a_r, a_o, a_a, a_k, agents):
         """
         Computes the desired direction based on k nearest neighbors
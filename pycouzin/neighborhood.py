@@ -0,0 +1,204 @@
+import numpy as np
+
+from pycouzin.graph import adjacency_matrix, symmetrize
+
+
+# Zone labels of the pairs returned by `Neighborhood.edges()`
+REPULSION = 1
+ORIENTATION = 2
+ATTRACTION = 3
+
+
+def pairwise_distances(pos):
+    """
+    Computes the distance between every pair of positions.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+
+    Returns
+    -------
+    d : numpy.ndarray
+        An nxn matrix where d_ij is the distance between positions i and j.
+    """
+    dx = pos[:, 0][np.newaxis, :] - pos[:, 0][:, np.newaxis]
+    dy = pos[:, 1][np.newaxis, :] - pos[:, 1][:, np.newaxis]
+    return np.sqrt(dx ** 2 + dy ** 2)
+
+
+def nearest_indices(d, max_k, min_k=0):
+    """
+    Finds the neighbors of every agent ranked min_k (inclusive) to max_k
+    (exclusive) by distance, closest first, never including the agent itself.
+
+    Parameters
+    ----------
+    d : numpy.ndarray
+        An nxn distance matrix, see `pairwise_distances()`.
+    max_k : int
+    min_k : int
+
+    Returns
+    -------
+    nearest : numpy.ndarray
+        An n x (max_k - min_k) array of agent indices (fewer columns if
+        there are not max_k other agents).
+    """
+    d = d.copy()
+    np.fill_diagonal(d, np.inf)
+    return rank_nearest(d, max_k, min_k)
+
+
+def rank_nearest(d, max_k, min_k=0):
+    """
+    Ranks the columns of each row of `d` by distance and returns the ones
+    ranked min_k (inclusive) to max_k (exclusive), closest first.
+
+    Each row is expected to contain exactly one excluded entry (the agent
+    itself) set to infinity. Only the max_k closest entries of each row are
+    sorted; the rest are split off with `numpy.argpartition`.
+
+    Parameters
+    ----------
+    d : numpy.ndarray
+        An mxn matrix of distances from m agents to all n agents.
+    max_k : int
+    min_k : int
+
+    Returns
+    -------
+    nearest : numpy.ndarray
+        An m x (max_k - min_k) array of agent indices.
+    """
+    max_k, min_k = int(max_k), int(min_k)
+    available = min(max_k, d.shape[1] - 1)
+    start = max(available - (max_k - min_k), 0)
+    if available <= 0:
+        return np.zeros((d.shape[0], 0), dtype=int)
+    if available < d.shape[1]:
+        part = np.argpartition(d, available - 1, axis=1)[:, :available]
+    else:
+        part = np.tile(np.arange(d.shape[1]), (d.shape[0], 1))
+    order = np.argsort(np.take_along_axis(d, part, axis=1), axis=1)
+    part = np.take_along_axis(part, order, axis=1)
+    return part[:, start:available]
+
+
+def nearest_matrix(nearest, bidirectional=False, as_sparse=False):
+    """
+    Builds a k nearest neighbor adjacency matrix from neighbor indices.
+
+    Parameters
+    ----------
+    nearest : numpy.ndarray
+        An nxk array where row i holds the indices of agent i's neighbors,
+        see `nearest_indices()`.
+    bidirectional : boolean
+        If False (default), a_ji = 1 if and only if j is one of i's
+        neighbors, matching `Board.adjacency()`. If True, the matrix is made
+        symmetric, matching `Board.bidirectional_adjacency()`.
+    as_sparse : boolean
+        If True, returns a sparse matrix, see `graph.adjacency_matrix()`.
+
+    Returns
+    -------
+    A : numpy.ndarray or scipy.sparse.csc_matrix
+    """
+    n = nearest.shape[0]
+    cols = np.repeat(np.arange(n), nearest.shape[1])
+    a = adjacency_matrix(nearest.ravel(), cols, n, as_sparse)
+    if bidirectional:
+        a = symmetrize(a)
+    return a
+
+
+class Neighborhood:
+    """
+    The neighborhood structure of a board at a single time step.
+
+    The pairs of agents within the radius of attraction are found with a
+    single query to a neighbor search and labelled with their zone, and the
+    k nearest neighbors come from the same search, so every adjacency matrix
+    needed during a step comes from a single neighborhood pass. The zones
+    are assumed to be nested (rr <= ro <= ra).
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of agent positions.
+    rr : number
+        The radius of repulsion.
+    ro : number
+        The radius of orientation.
+    ra : number
+        The radius of attraction.
+    k : int
+        The number of nearest neighbors.
+    index : NeighborSearch
+        A neighbor search over `pos`.
+
+    Attributes
+    ----------
+    nearest : numpy.ndarray
+        An nxk array where row i holds the indices of agent i's k nearest
+        neighbors, closest first.
+    """
+
+    def __init__(self, pos, rr, ro, ra, k, index):
+        self.n = pos.shape[0]
+        i, j, d = index.pairs(ra)
+        if len(i) > 1 and not np.all(np.diff(i * self.n + j) > 0):
+            # Keep each agent's neighbors in increasing order
+            order = np.lexsort((j, i))
+            i, j, d = i[order], j[order], d[order]
+        labels = np.full(len(d), ATTRACTION, dtype=np.int8)
+        labels[d < ro] = ORIENTATION
+        labels[d < rr] = REPULSION
+        self._edges = (i, j, labels)
+        self.nearest = index.nearest(k)
+
+    def edges(self):
+        """
+        Returns every ordered pair of agents within the radius of attraction
+        of each other, together with the zone they fall in, sorted by i and
+        then j.
+
+        Returns
+        -------
+        i : numpy.ndarray
+        j : numpy.ndarray
+        labels : numpy.ndarray
+            The int8 zone label of each pair.
+        """
+        return self._edges
+
+    def zone_adjacency(self, zone, as_sparse=False):
+        """
+        Returns the adjacency matrix of agents within the given zone of each
+        other.
+
+        Parameters
+        ----------
+        zone : int
+            One of REPULSION, ORIENTATION or ATTRACTION.
+        as_sparse : boolean
+            If True, returns a sparse matrix, see `graph.adjacency_matrix()`.
+
+        Returns
+        -------
+        A : numpy.ndarray or scipy.sparse.csc_matrix
+            A symmetric matrix where a_ij = 1 if and only if agents i and j
+            are within `zone` of each other.
+        """
+        i, j, labels = self._edges
+        mask = labels == zone
+        return adjacency_matrix(i[mask], j[mask], self.n, as_sparse)
+
+    def nearest_adjacency(self, bidirectional=False, as_sparse=False):
+        """
+        Returns the k nearest neighbor adjacency matrix, see
+        `nearest_matrix()`.
+        """
+        return nearest_matrix(self.nearest, bidirectional, as_sparse)
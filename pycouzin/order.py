@@ -0,0 +1,245 @@
+import numpy as np
+
+from pycouzin import graph
+from pycouzin.board import SEARCHES
+from pycouzin.kernels import unit
+
+
+def centroid(pos):
+    """
+    Returns the center of mass of the agents.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+
+    Returns
+    -------
+    c : numpy.ndarray
+    """
+    return pos.mean(axis=0)
+
+
+def extent(pos):
+    """
+    Measures how spread out the group is around its centroid.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+
+    Returns
+    -------
+    gyration : number
+        The radius of gyration, the root mean square distance from the
+        centroid.
+    radius : number
+        The largest distance from the centroid.
+    """
+    r = np.sqrt(((pos - centroid(pos)) ** 2).sum(axis=1))
+    return np.sqrt((r ** 2).mean()), r.max()
+
+
+def polarization(ori):
+    """
+    Returns the length of the mean heading, 1 when all agents head the
+    same way and close to 0 when headings are disordered (swarm or torus).
+
+    Parameters
+    ----------
+    ori : numpy.ndarray
+        An nx2 array of orientations.
+
+    Returns
+    -------
+    p : number
+    """
+    u = unit(ori)
+    return np.sqrt((u.mean(axis=0) ** 2).sum())
+
+
+def milling(pos, ori):
+    """
+    Returns the normalized angular momentum of the group about its
+    centroid, 1 when all agents circle it the same way (torus) and close to
+    0 otherwise.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    ori : numpy.ndarray
+        An nx2 array of orientations.
+
+    Returns
+    -------
+    m : number
+    """
+    r = unit(pos - centroid(pos))
+    u = unit(ori)
+    return abs((r[:, 0] * u[:, 1] - r[:, 1] * u[:, 0]).mean())
+
+
+def _search(pos, search, cell_size=None):
+    if cell_size is None:
+        # Cells holding about one agent at the group's density
+        span = (pos.max(axis=0) - pos.min(axis=0)).max()
+        cell_size = max(span / np.sqrt(len(pos)), 1e-9)
+    return SEARCHES[search](pos, cell_size)
+
+
+def nearest_distances(pos, search='cells'):
+    """
+    Returns the distance from every agent to its nearest neighbor.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    search : str
+        The neighbor search backend, see `Board`. Defaults to 'cells'.
+
+    Returns
+    -------
+    d : numpy.ndarray
+    """
+    if len(pos) < 2:
+        return np.full(len(pos), np.inf)
+    nearest = _search(pos, search).nearest(1)[:, 0]
+    return np.sqrt(((pos[nearest] - pos) ** 2).sum(axis=1))
+
+
+def nearest_stats(pos, search='cells'):
+    """
+    Summarizes the nearest neighbor distances, see `nearest_distances()`.
+
+    Returns
+    -------
+    stats : dict
+        The 'mean', 'std', 'min' and 'max' distance.
+    """
+    d = nearest_distances(pos, search)
+    return {'mean': d.mean(), 'std': d.std(), 'min': d.min(),
+            'max': d.max()}
+
+
+def largest_cluster(pos, radius, search='cells'):
+    """
+    Returns the number of agents in the largest cluster, where agents
+    closer than `radius` belong to the same cluster.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    radius : number
+    search : str
+        The neighbor search backend, see `Board`. Defaults to 'cells'.
+
+    Returns
+    -------
+    size : int
+    """
+    i, j, _ = _search(pos, search, radius).pairs(radius)
+    a = graph.adjacency_matrix(i, j, len(pos), graph.sparse is not None)
+    return graph.component_sizes(a)[0]
+
+
+def order_parameters(pos, ori, radius, search='cells'):
+    """
+    Computes every order parameter of this module for one time step.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+    ori : numpy.ndarray
+    radius : number
+        The radius of `largest_cluster()`, e.g. the radius of attraction.
+    search : str
+        Defaults to 'cells'.
+
+    Returns
+    -------
+    params : dict
+        The 'polarization', 'milling', 'centroid_x', 'centroid_y',
+        'gyration', 'radius', 'nn_mean', 'nn_std', 'nn_min', 'nn_max' and
+        'largest_cluster' of the group.
+    """
+    c = centroid(pos)
+    gyration, r = extent(pos)
+    params = {
+        'polarization': polarization(ori),
+        'milling': milling(pos, ori),
+        'centroid_x': c[0],
+        'centroid_y': c[1],
+        'gyration': gyration,
+        'radius': r,
+        'largest_cluster': largest_cluster(pos, radius, search),
+    }
+    for key, value in nearest_stats(pos, search).items():
+        params['nn_' + key] = value
+    return params
+
+
+class RunningStats:
+    """
+    Running count, mean, variance, minimum and maximum of a stream of
+    values, updated in constant time and memory with Welford's algorithm.
+
+    Values may be numbers or arrays of a fixed shape, which are aggregated
+    element-wise. Non-finite values, NaN as well as infinities, are
+    skipped, so metrics that were not computed at a step leave the
+    aggregates unchanged.
+
+    Attributes
+    ----------
+    count : int or numpy.ndarray
+    mean : number or numpy.ndarray
+    min : number or numpy.ndarray
+    max : number or numpy.ndarray
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._m2 = 0.0
+
+    def update(self, value):
+        """
+        Adds a value to the aggregates, skipping its non-finite elements.
+
+        Parameters
+        ----------
+        value : number or numpy.ndarray
+        """
+        value = np.asarray(value, dtype=float)
+        known = np.isfinite(value)
+        x = np.where(known, value, 0)
+        count = self.count + known
+        delta = x - self.mean
+        mean = self.mean + np.where(known, delta / np.maximum(count, 1), 0)
+        self._m2 = self._m2 + np.where(known, delta * (x - mean), 0)
+        self.count = count
+        self.mean = mean
+        self.min = np.where(known, np.minimum(self.min, x), self.min)
+        self.max = np.where(known, np.maximum(self.max, x), self.max)
+
+    @property
+    def var(self):
+        """
+        The sample variance, NaN until two values have been seen.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self._m2 / (self.count - 1),
+                            np.nan)
+
+    @property
+    def std(self):
+        """
+        The sample standard deviation.
+        """
+        return np.sqrt(self.var)
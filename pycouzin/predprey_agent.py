@@ -1,10 +1,20 @@
+from pycouzin import kernels
+from pycouzin.graph import column_neighbors
+from pycouzin.state import PREY, PREDATOR, DEAD
 from pycouzin.topological_agent import TopologicalAgent
 from pycouzin.vector import Vector2D
 
 
 class PredatorAgent(TopologicalAgent):
+    """
+    An agent that chases prey, see `get_desired_direction()`.
 
-    color = 'r'
+    Boards created with `vectorize=True` update all predators at once with
+    `kernels.chase_directions()`.
+    """
+
+    batch_rule = 'chase'
+    initial_kind = PREDATOR
 
     desist_num = 3
     desist_r = 5
@@ -16,79 +26,70 @@ class PredatorAgent(TopologicalAgent):
 
         It's speed is twice the prey's, angular velocity is 4x
         """
-        self.speed = 1.0
-        self.thetamax = 0.20
-        nearest_prey = None
-        nearest_dist = float('Inf')
-
-        in_desist_r = 0
-        prey_count = 0
-        d_p = Vector2D(0, 0)
-        d_o = Vector2D(0, 0)
-        for agent in agents:
-            distance = self.p.distance_to(agent.p)
-            if isinstance(agent, PreyAgent):
-                prey_count += 1
-                rp = (agent.p - self.p).normalize()
-                d_p += rp
-                if distance <= self.desist_r:
-                    in_desist_r += 1
-                if distance < nearest_dist:
-                    nearest_dist = distance
-                    nearest_prey = agent
-            if isinstance(agent, PredatorAgent):
-                # Avoid other predators that are too close
-                if distance <= self.pred_r:
-                    ro = (agent.p - self.p).normalize()
-                    d_o -= ro
-
-        if nearest_prey is None:
+        state = self.board.state
+        d, starved = kernels.chase_directions(
+            state.pos, state.kind, [self.i], self.desist_r, self.desist_num,
+            self.pred_r)
+        if starved[0]:
             # All prey dead. Stop
             self.speed = 0
             self.thetamax = 0
-            return d_o.normalize()
-        elif in_desist_r < self.desist_num and prey_count > self.desist_num:
-            # Too few prey nearby with many surviving, turn back to main body
-            return (d_p.normalize() + d_o.normalize()).normalize()
         else:
-            d = (nearest_prey.p - self.p).normalize()
-            return (d + d_o.normalize()).normalize()
+            params = self.board.kinds[self.kind]
+            self.speed = params['speed']
+            self.thetamax = params['thetamax']
+        return Vector2D(d[0, 0], d[0, 1])
 
 
 class PreyAgent(TopologicalAgent):
+    """
+    A topological agent that schools with other prey only, flees from
+    predators and evades the dead.
+
+    Prey caught by a predator stop where they are and turn into the DEAD
+    kind at the end of the step, after which they no longer move.
+
+    Boards created with `vectorize=True` update all prey at once with
+    `kernels.threat_directions()` and `kernels.zone_directions()`.
+    """
+
+    batch_rule = 'prey'
+    initial_kind = PREY
 
-    color = 'c'
+    flee_speed = 1.5
     pred_repulsion = 5
     dead_repulsion = 7
     pred_kill = 0.75
 
     def get_desired_direction(self, a_r, a_o, a_a, a_k, agents):
-        base_speed = 0.5
-        self.speed = base_speed
-        self.thetamax = 0.05
+        if self.kind == DEAD:
+            return self.o
+        params = self.board.kinds[self.kind]
+        self.speed = params['speed']
+        self.thetamax = params['thetamax']
 
         # Check to see if predators or dead agents are nearby
         d_p = Vector2D(0, 0)
         d_d = Vector2D(0, 0)
         run = False    # should run from predator
         evade = False  # should evade the dead
-        for agent in agents:
+        kind = self.board.state.kind
+        reach = max(self.pred_kill, self.pred_repulsion, self.dead_repulsion)
+        for j in self.board.neighbors(self.i, reach):
+            agent = agents[j]
             distance = self.p.distance_to(agent.p)
-            if isinstance(agent, PredatorAgent):
+            if kind[j] == PREDATOR:
                 if distance <= self.pred_kill:
                     # Kill, too close to predator
-                    dead = DeadAgent(self.board, self.p, self.o)
-                    dead.i = self.i
-                    self.replace_with = dead
-                    return Vector2D(0, 0)
+                    self.kill()
+                    return self.o
                 if distance <= self.pred_repulsion:
                     # Adreneline rush, run from predator at 3x speed
                     run = True
-                    self.speed = base_speed * 3
+                    self.speed = self.flee_speed
                     pij = (agent.p - self.p).normalize()
                     d_p -= pij
-            elif isinstance(agent, DeadAgent) and\
-                    distance <= self.dead_repulsion:
+            elif kind[j] == DEAD and distance <= self.dead_repulsion:
                 evade = True
                 rd = (agent.p - self.p).normalize()
                 d_d -= rd
@@ -102,24 +103,27 @@ class PreyAgent(TopologicalAgent):
         else:
             return base
 
+    def kill(self):
+        """
+        Stops this agent and queues its transition to the DEAD kind.
+        """
+        self.speed = 0
+        self.transition(DEAD)
+
     def get_adjacent_agents(self, a, agents):
         """
         Only consider other Prey as adjacent, other types are taken into
         special consideration.
         """
-        all_adj = TopologicalAgent.get_adjacent_agents(self, a, agents)
-        adj_agents = []
-        for agent in all_adj:
-            if isinstance(agent, PreyAgent):
-                adj_agents.append(agent)
-        return adj_agents
+        j = column_neighbors(a, self.i)
+        j = j[(j != self.i) & (self.board.state.kind[j] == PREY)]
+        return [agents[k] for k in j]
 
 
 class DeadAgent(TopologicalAgent):
+    """
+    An agent that starts out dead. Prey that are killed change kind in
+    place instead of being replaced by one.
+    """
 
-    color = 'k'
-
-    def __init__(self, board, p0=None, o0=None):
-        TopologicalAgent.__init__(self, board, p0, o0)
-        self.speed = 0
-        self.thetamax = 0
+    initial_kind = DEAD
@@ -0,0 +1,388 @@
+import bisect
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from pycouzin.board import Board
+from pycouzin.couzinboard import FIEDLER_KEYS
+
+
+# The arrays stored for every recorded step
+FIELDS = ('pos', 'ori', 'kind', 'metrics')
+
+
+class TrajectoryRecorder:
+    """
+    Records the trajectory of a board to a directory of binary chunks.
+
+    Every `chunk` steps, the positions, orientations and agent type codes
+    of those steps, along with their metrics, are handed to a background
+    thread that saves them as `.npy` files, so stepping the board never
+    waits on the disk unless the writer falls `queue_size` chunks behind.
+    A `meta.json` file describing the recording is written on `close()`.
+
+    A recorder can be passed as the callback of `CouzinBoard.simulate()`,
+    in which case each step holds the state after the step along with the
+    metrics computed at that step. It is best
+    used as a context manager so it is closed even on errors::
+
+        with TrajectoryRecorder('out', board.n) as rec:
+            board.simulate(callback=rec)
+
+    Parameters
+    ----------
+    path : str
+        The directory to write to, created as needed.
+    n : int
+        The number of agents.
+    chunk : int
+        The number of steps per chunk file, defaults to 64.
+    dtype : numpy.dtype
+        The type positions and orientations are stored as. Defaults to
+        float32, which halves the size of a recording.
+    metrics : sequence of str
+        The names of the per-step metrics, defaults to FIEDLER_KEYS.
+    queue_size : int
+        The number of full chunks that may wait for the writer before
+        recording blocks, defaults to 4.
+
+    Attributes
+    ----------
+    types : dict
+        Maps the name of each kind of `Board.kinds` to its code in the
+        `kind` arrays.
+    colors : dict
+        Maps the name of each kind to its plot color.
+    steps : int
+        The number of steps recorded so far.
+    """
+
+    def __init__(self, path, n, chunk=64, dtype=np.float32,
+                 metrics=FIEDLER_KEYS, queue_size=4):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        self.n = n
+        self.chunk = chunk
+        self.dtype = np.dtype(dtype)
+        self.metrics = list(metrics)
+        self.types = {}
+        self.colors = {}
+        self.steps = 0
+        self.chunks = []
+        self._buffers = None
+        self._error = None
+        self._queue = queue.Queue(queue_size)
+        self._writer = threading.Thread(target=self._write_chunks)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __call__(self, board, i, record):
+        self.record(board, record)
+
+    def record(self, board, metrics=None):
+        """
+        Records the current state of `board` as the next step.
+
+        Parameters
+        ----------
+        board : Board
+        metrics : dict, sequence of number or None
+            The metrics of this step by name, or in the order of
+            `self.metrics`. Metrics that are missing or None are stored as
+            NaN.
+        """
+        self._check()
+        if self._buffers is None:
+            self._buffers = self._allocate()
+        row = self.steps % self.chunk
+        pos, ori, kind, values = self._buffers
+        pos[row] = board.state.pos
+        ori[row] = board.state.ori
+        kind[row] = board.state.kind
+        if not self.types:
+            for code, params in board.kinds.items():
+                self.types[params['name']] = int(code)
+                self.colors[params['name']] = params['color']
+        if metrics is None:
+            metrics = {}
+        if isinstance(metrics, dict):
+            metrics = [metrics.get(name) for name in self.metrics]
+        values[row] = [np.nan if v is None else np.real(v) for v in metrics]
+        self.steps += 1
+        if row == self.chunk - 1:
+            self._flush()
+
+    def close(self):
+        """
+        Writes any partial chunk, waits for the writer to finish and writes
+        `meta.json`. Further calls do nothing.
+        """
+        if self._writer is None:
+            return
+        if self._buffers is not None and self.steps % self.chunk:
+            self._flush()
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        self._check()
+
+        meta = {
+            'n': self.n,
+            'steps': self.steps,
+            'chunk': self.chunk,
+            'dtype': self.dtype.name,
+            'types': self.types,
+            'colors': self.colors,
+            'metrics': self.metrics,
+            'chunks': self.chunks,
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+
+    def _allocate(self):
+        return (np.empty((self.chunk, self.n, 2), dtype=self.dtype),
+                np.empty((self.chunk, self.n, 2), dtype=self.dtype),
+                np.empty((self.chunk, self.n), dtype=np.int16),
+                np.empty((self.chunk, len(self.metrics))))
+
+    def _flush(self):
+        count = (self.steps - 1) % self.chunk + 1
+        name = '%06d' % len(self.chunks)
+        self.chunks.append([name, self.steps - count, count])
+        self._queue.put((name, [b[:count] for b in self._buffers]))
+        # The writer now owns the buffers, so the next chunk needs new ones
+        self._buffers = None
+
+    def _write_chunks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            name, arrays = item
+            try:
+                for field, a in zip(FIELDS, arrays):
+                    np.save(os.path.join(self.path, '%s_%s.npy'
+                                         % (field, name)), a)
+            except Exception as e:
+                self._error = e
+
+    def _check(self):
+        if self._error is not None:
+            raise IOError('Writing the trajectory failed: %s' % self._error)
+
+
+class TrajectoryReader:
+    """
+    Reads a recording made by `TrajectoryRecorder` without loading it into
+    memory.
+
+    Every chunk file is opened as a read-only memory map, so a frame or the
+    track of an agent only touches the parts of the files it needs and runs
+    larger than memory can be examined.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the recording.
+
+    Attributes
+    ----------
+    n : int
+        The number of agents.
+    steps : int
+        The number of recorded steps.
+    types : dict
+        Maps the names of the kinds to their codes in the `kind` arrays.
+    colors : dict
+        Maps the names of the kinds to their plot colors.
+    metrics : list of str
+        The names of the recorded metrics.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.n = meta['n']
+        self.steps = meta['steps']
+        self.types = meta['types']
+        self.colors = meta.get('colors', {})
+        self.metrics = meta['metrics']
+        self.starts = [start for _, start, _ in meta['chunks']]
+        self._chunks = [
+            dict((field, np.load(os.path.join(path, '%s_%s.npy'
+                                              % (field, name)),
+                                 mmap_mode='r'))
+                 for field in FIELDS)
+            for name, _, _ in meta['chunks']]
+
+    def __len__(self):
+        return self.steps
+
+    def frame(self, t, field='pos'):
+        """
+        Returns one field of recorded step t.
+
+        Parameters
+        ----------
+        t : int
+            The step, negative values count from the end.
+        field : str
+            One of FIELDS, defaults to 'pos'.
+
+        Returns
+        -------
+        frame : numpy.ndarray
+            A read-only view, nx2 for positions and orientations, length n
+            for type codes and length len(metrics) for metrics.
+        """
+        if t < 0:
+            t += self.steps
+        if not 0 <= t < self.steps:
+            raise IndexError('Step %i is out of range' % t)
+        c = bisect.bisect_right(self.starts, t) - 1
+        return self._chunks[c][field][t - self.starts[c]]
+
+    def track(self, i, field='pos', start=0, stop=None):
+        """
+        Returns the recorded values of agent i over a range of steps. Only
+        that agent's column of each chunk is read, so tracks of long runs
+        stay small.
+
+        Parameters
+        ----------
+        i : int
+        field : str
+            'pos' (default), 'ori' or 'kind'.
+        start : int
+        stop : int or None
+            The steps start (inclusive) to stop (exclusive), defaulting to
+            the whole recording.
+
+        Returns
+        -------
+        track : numpy.ndarray
+            A (stop - start) x 2 array for positions and orientations.
+        """
+        return self._slice(start, stop, field, i)
+
+    def window(self, start=0, stop=None, field='pos'):
+        """
+        Returns one field of a range of steps as a single array. Windows
+        within one chunk are views; others are copied together from the
+        chunks they span.
+
+        Parameters
+        ----------
+        start : int
+        stop : int or None
+            The steps start (inclusive) to stop (exclusive), defaulting to
+            the whole recording.
+        field : str
+            One of FIELDS, defaults to 'pos'.
+
+        Returns
+        -------
+        window : numpy.ndarray
+            An array with one row per step, see `frame()`.
+        """
+        return self._slice(start, stop, field)
+
+    def windows(self, size, field='pos', start=0, stop=None):
+        """
+        Iterates over consecutive windows of `size` steps, so a whole run
+        can be processed with a bounded amount of memory.
+
+        Yields
+        ------
+        start : int
+            The first step of the window.
+        window : numpy.ndarray
+            See `window()`. The last window may be shorter.
+        """
+        if stop is None or stop > self.steps:
+            stop = self.steps
+        for lo in range(start, stop, size):
+            yield lo, self.window(lo, min(lo + size, stop), field)
+
+    def metric_df(self):
+        """
+        Returns the recorded metrics, NaN where they were not computed.
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            Indexed by step, one column per metric.
+        """
+        return pd.DataFrame(np.asarray(self.window(field='metrics')),
+                            columns=self.metrics)
+
+    def board(self, t, **kwargs):
+        """
+        Builds a board holding recorded step t, so that metrics such as
+        connectivity or Fiedler eigenvalues can be computed with the methods
+        of `Board`.
+
+        Parameters
+        ----------
+        t : int
+        kwargs
+            Passed to `Board.from_arrays()`, e.g. search or sparse.
+
+        Returns
+        -------
+        board : Board
+        """
+        return Board.from_arrays(self.frame(t, 'pos'), self.frame(t, 'ori'),
+                                 **kwargs)
+
+    def boards(self, start=0, stop=None, every=1, **kwargs):
+        """
+        Iterates over the boards of every `every`-th step, see `board()`.
+
+        Yields
+        ------
+        t : int
+        board : Board
+        """
+        if stop is None or stop > self.steps:
+            stop = self.steps
+        for t in range(start, stop, every):
+            yield t, self.board(t, **kwargs)
+
+    def _slice(self, start, stop, field, i=None):
+        # Takes the rows of each chunk, or only column i of them, so that
+        # nothing outside the requested steps and agent is read
+        if stop is None or stop > self.steps:
+            stop = self.steps
+        parts = []
+        for c in range(len(self._chunks)):
+            a = self._chunks[c][field]
+            lo = max(start - self.starts[c], 0)
+            hi = min(stop - self.starts[c], len(a))
+            if lo < hi:
+                parts.append(a[lo:hi] if i is None else a[lo:hi, i])
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            shapes = {'pos': (self.n, 2), 'ori': (self.n, 2),
+                      'kind': (self.n,), 'metrics': (len(self.metrics),)}
+            shape = shapes[field]
+            return np.empty((0,) + (shape if i is None else shape[1:]))
+        return np.concatenate(parts)
@@ -0,0 +1,221 @@
+import math
+import multiprocessing
+import os
+import subprocess
+import numpy as np
+
+from pycouzin.recorder import TrajectoryReader
+
+
+# The color and label of each Fiedler eigenvalue, as in `CouzinBoard.run()`
+FIEDLER_STYLES = {
+    'attraction': ('g', 'Attraction'),
+    'orientation': ('b', 'Orientation'),
+    'repulsion': ('r', 'Repulsion'),
+    'combined': ('c', 'Attr + Or + Rep'),
+    'nearest': ('m', 'K Nearest'),
+}
+
+
+def render(path, saveloc, processes=None, every=1, fps=15, dpi=100,
+           figsize=(32, 6), ffmpeg='ffmpeg'):
+    """
+    Renders a recorded run to <saveloc>/animation.mp4, with its first and
+    last frames in <saveloc>/first.png and <saveloc>/last.png.
+
+    The frames are split into contiguous ranges, one per worker process.
+    Each worker renders its range into a separate video segment, and the
+    segments are then joined without re-encoding by ffmpeg's concat demuxer.
+
+    Parameters
+    ----------
+    path : str
+        The directory of a recording made by `TrajectoryRecorder`.
+    saveloc : str
+        The output directory, created as needed.
+    processes : int or None
+        The number of worker processes, or None (default) for one per CPU.
+        With 1, the frames are rendered in this process.
+    every : int
+        Renders only every `every`-th step, and the final one, defaults
+        to 1.
+    fps : int
+        The frame rate of the video, defaults to 15.
+    dpi : int
+        The resolution of the frames, defaults to 100.
+    figsize : tuple
+        The size of the figure in inches, defaults to (32, 6).
+    ffmpeg : str
+        The ffmpeg executable, defaults to 'ffmpeg' on the PATH.
+    """
+    reader = TrajectoryReader(path)
+    frames = np.arange(0, len(reader), every)
+    if len(frames) == 0:
+        raise ValueError('The recording in %s has no steps' % path)
+    if frames[-1] != len(reader) - 1:
+        # The video and last.png always end on the final state
+        frames = np.append(frames, len(reader) - 1)
+    if not os.path.exists(saveloc):
+        os.makedirs(saveloc)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    options = {'fps': fps, 'dpi': dpi, 'figsize': figsize, 'ffmpeg': ffmpeg}
+    parts = [part for part in np.array_split(frames, processes)
+             if len(part) > 0]
+    segments = [os.path.join(saveloc, 'segment_%03d.mp4' % k)
+                for k in range(len(parts))]
+    tasks = [(path, part, segment, options)
+             for part, segment in zip(parts, segments)]
+    if processes == 1:
+        for task in tasks:
+            _render_segment(task)
+    else:
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        try:
+            pool.map(_render_segment, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    listing = os.path.join(saveloc, 'segments.txt')
+    with open(listing, 'w') as f:
+        for segment in segments:
+            f.write("file '%s'\n" % os.path.basename(segment))
+    subprocess.check_call([ffmpeg, '-y', '-loglevel', 'error', '-f',
+                           'concat', '-safe', '0', '-i', listing, '-c',
+                           'copy', os.path.join(saveloc, 'animation.mp4')])
+    for segment in segments:
+        os.remove(segment)
+    os.remove(listing)
+
+    frame = FrameRenderer(reader, figsize, dpi)
+    frame.save(frames[0], os.path.join(saveloc, 'first.png'))
+    frame.save(frames[-1], os.path.join(saveloc, 'last.png'))
+
+
+def _render_segment(task):
+    import matplotlib
+    from matplotlib import animation
+
+    path, frames, segment, options = task
+    frame = FrameRenderer(TrajectoryReader(path), options['figsize'],
+                          options['dpi'])
+    matplotlib.rcParams['animation.ffmpeg_path'] = options['ffmpeg']
+    writer = animation.FFMpegWriter(fps=options['fps'], bitrate=4096)
+    with writer.saving(frame.fig, segment, options['dpi']):
+        for t in frames:
+            frame.draw(t)
+            writer.grab_frame()
+
+
+class FrameRenderer:
+    """
+    Draws frames of a recorded run: the agents with their orientations on
+    the left, and the Fiedler eigenvalues up to the frame with their
+    running averages on the right.
+
+    The figure is built once, off screen, and every frame only updates the
+    data of its artists. All orientations are drawn as a single
+    `LineCollection`.
+
+    Parameters
+    ----------
+    reader : TrajectoryReader
+    figsize : tuple
+        The size of the figure in inches.
+    dpi : int
+    """
+
+    def __init__(self, reader, figsize=(32, 6), dpi=100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+
+        self.reader = reader
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        grid = self.fig.add_gridspec(1, 4)
+        self.ax1 = self.fig.add_subplot(grid[0, 0], aspect='equal')
+        self.ax2 = self.fig.add_subplot(grid[0, 1:3])
+        self.ax1.set_title('Agent Positions and Orientations')
+        self.ax2.set_title('Fiedler Eigenvalues')
+        self.ax1.grid(True)
+        self.ax2.grid(True)
+        self.time_text = self.ax1.text(0.02, 0.95, '',
+                                       transform=self.ax1.transAxes)
+
+        # Colors by type code, from the colors of the recorded classes
+        palette = ['b'] * (max(list(reader.types.values()) + [0]) + 1)
+        for name, code in reader.types.items():
+            palette[code] = reader.colors.get(name, 'b')
+        self.palette = np.array(palette, dtype=object)
+
+        pos = reader.frame(0, 'pos')
+        self.scat = self.ax1.scatter(pos[:, 0], pos[:, 1], s=50)
+        self.lines = LineCollection([], colors='k')
+        self.ax1.add_collection(self.lines)
+
+        self.steps = np.arange(1, len(reader) + 1)
+        self.values = np.asarray(reader.metric_df().values, dtype=float)
+        known = np.isfinite(self.values)
+        counts = np.maximum(np.cumsum(known, axis=0), 1)
+        self.averages = np.cumsum(np.where(known, self.values, 0),
+                                  axis=0) / counts
+        self.known = known
+        self.plots = []
+        for c, key in enumerate(reader.metrics):
+            color, label = FIEDLER_STYLES.get(key, ('k', key))
+            eplot, = self.ax2.plot([], [], color=color, marker='+',
+                                   label='%s: Fiedler Eigenvalues' % label)
+            aplot, = self.ax2.plot([], [], color=color,
+                                   label='%s: Average Fiedler Eigenvalue'
+                                   % label)
+            self.plots.append((c, eplot, aplot))
+        self.ax2.legend(loc=3, ncol=1, bbox_to_anchor=(1.05, 0))
+        self.ax2.set_xlim((1, max(len(reader), 2)))
+        maxy = self.values[known].max() if known.any() else 1
+        maxyc = math.ceil(maxy)
+        if maxyc - maxy < 0.2:
+            maxyc += 1
+        self.ax2.set_ylim((0, maxyc))
+
+    def draw(self, t):
+        """
+        Updates the figure to show step t.
+
+        Parameters
+        ----------
+        t : int
+        """
+        reader = self.reader
+        pos = np.asarray(reader.frame(t, 'pos'), dtype=float)
+        ori = np.asarray(reader.frame(t, 'ori'), dtype=float)
+        self.time_text.set_text('t = %i' % (t + 1))
+        self.scat.set_offsets(pos)
+        self.scat.set_color(self.palette[reader.frame(t, 'kind')].tolist())
+        self.lines.set_segments(np.stack([pos, pos + ori], axis=1))
+
+        lo = pos.min(axis=0) - 1
+        length = (pos.max(axis=0) + 1 - lo).max()
+        self.ax1.set_xlim((lo[0], lo[0] + length))
+        self.ax1.set_ylim((lo[1], lo[1] + length))
+
+        for c, eplot, aplot in self.plots:
+            known = self.known[:t + 1, c]
+            eplot.set_data(self.steps[:t + 1][known],
+                           self.values[:t + 1, c][known])
+            aplot.set_data([1, t + 1], [self.averages[t, c]] * 2)
+
+    def save(self, t, filename):
+        """
+        Draws step t and saves it as an image.
+
+        Parameters
+        ----------
+        t : int
+        filename : str
+        """
+        self.draw(t)
+        self.fig.savefig(filename, dpi=self.dpi)
@@ -0,0 +1,69 @@
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from pycouzin import rng
+
+
+def run_replicates(factory, measure, grid, reps, seed=None, processes=None,
+                   labels=None):
+    """
+    Runs `reps` independent replicates of a simulation for every parameter
+    in `grid`, spread over a pool of worker processes.
+
+    Every replicate gets its own seed, spawned from `seed` (see
+    `rng.spawn()`) in grid order, so the results do not depend on the
+    number of processes or the order in which the replicates finish.
+
+    Parameters
+    ----------
+    factory : function : param, seed -> Board
+        Builds the board of one replicate. It should pass `seed` on to the
+        board. Must be picklable, i.e. defined at the top level of a module
+        (or a `functools.partial` of such a function), unless processes is 1.
+    measure : function : board, param -> value
+        Measures the board of one replicate, returning a scalar. Must be
+        picklable like `factory`.
+    grid : sequence
+        The parameter values to sweep.
+    reps : int
+        The number of replicates per parameter value.
+    seed : None, int or numpy.random.SeedSequence
+        The root seed of the sweep. Defaults to None, which draws fresh OS
+        entropy.
+    processes : int or None
+        The number of worker processes, or None (default) for one per CPU.
+        With 1, the replicates run in this process.
+    labels : sequence or None
+        The index of the returned DataFrame, defaulting to `grid`.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        One row per parameter value and one column per replicate, numbered
+        from 0.
+    """
+    grid = list(grid)
+    seeds = rng.spawn(seed, len(grid) * reps)
+    tasks = [(factory, measure, param, seeds[p * reps + r])
+             for p, param in enumerate(grid) for r in range(reps)]
+
+    if processes == 1:
+        values = [_run_task(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            values = pool.map(_run_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    if labels is None:
+        labels = grid
+    values = np.array(values).reshape(len(grid), reps)
+    return pd.DataFrame(values, index=labels, columns=range(reps))
+
+
+def _run_task(task):
+    factory, measure, param, seed = task
+    return measure(factory(param, seed), param)
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+def make_rng(seed=None):
+    """
+    Creates the random number generator used by a board.
+
+    Parameters
+    ----------
+    seed : None, int, numpy.random.SeedSequence or numpy.random.Generator
+        None (default) seeds from fresh OS entropy. An int or SeedSequence
+        gives a reproducible stream. A Generator is used as is.
+
+    Returns
+    -------
+    rng : numpy.random.Generator
+    """
+    return np.random.default_rng(seed)
+
+
+def spawn(seed, count):
+    """
+    Derives independent seeds for `count` replicates from a single seed,
+    using `numpy.random.SeedSequence` spawning. The streams do not overlap,
+    and replicate r gets the same stream whatever the other replicates do
+    or how many are run.
+
+    Parameters
+    ----------
+    seed : None, int or numpy.random.SeedSequence
+        The root seed. None draws fresh OS entropy.
+    count : int
+
+    Returns
+    -------
+    seeds : list of numpy.random.SeedSequence
+        One seed per replicate, each accepted as the `seed` of a board.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(count)
@@ -0,0 +1,119 @@
+class MetricSchedule:
+    """
+    A registry of the metrics a board computes, each of which can be
+    enabled, disabled or sampled every k steps.
+
+    Metrics are only evaluated when they are due, so disabled metrics cost
+    nothing.
+
+    Attributes
+    ----------
+    names : list of str
+        The registered metrics, in order of registration.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._funcs = {}
+        self._every = {}
+
+    def register(self, name, func, every=1, enabled=True):
+        """
+        Adds a metric, or replaces the one with the same name.
+
+        Parameters
+        ----------
+        name : str
+        func : function : board, neighborhood -> value
+            Computes the metric. A dict value is flattened into one entry
+            per key, named <name>_<key>.
+        every : int
+            The metric is due every `every` steps, starting with the first.
+            Defaults to 1.
+        enabled : boolean
+            Defaults to True.
+        """
+        if name not in self._funcs:
+            self.names.append(name)
+        self._funcs[name] = func
+        self._every[name] = every if enabled else 0
+
+    def enable(self, name, every=1):
+        """
+        Enables a metric, sampled every `every` steps (default 1).
+        """
+        self._check(name)
+        self._every[name] = every
+
+    def disable(self, name):
+        """
+        Disables a metric.
+        """
+        self._check(name)
+        self._every[name] = 0
+
+    def only(self, *names):
+        """
+        Enables the given metrics, keeping their sampling, or every step
+        if they were disabled, and disables all others.
+        """
+        for name in names:
+            self._check(name)
+        for name in self.names:
+            if name not in names:
+                self._every[name] = 0
+            elif not self._every[name]:
+                self._every[name] = 1
+
+    def every(self, name):
+        """
+        Returns the sampling interval of a metric, 0 if it is disabled.
+        """
+        self._check(name)
+        return self._every[name]
+
+    def due(self, step):
+        """
+        Returns the names of the enabled metrics due at a time step.
+
+        Parameters
+        ----------
+        step : int
+            The time step, 0 indexed.
+
+        Returns
+        -------
+        names : list of str
+        """
+        return [name for name in self.names
+                if self._every[name] and step % self._every[name] == 0]
+
+    def evaluate(self, board, nb, names):
+        """
+        Computes metrics.
+
+        Parameters
+        ----------
+        board : Board
+        nb : Neighborhood
+        names : list of str
+
+        Returns
+        -------
+        record : dict
+            The value of each metric, see `register()`.
+        """
+        record = {}
+        for name in names:
+            self._check(name)
+            value = self._funcs[name](board, nb)
+            if isinstance(value, dict):
+                for key in value:
+                    record['%s_%s' % (name, key)] = value[key]
+            else:
+                record[name] = value
+        return record
+
+    def _check(self, name):
+        if name not in self._funcs:
+            raise KeyError('Unknown metric %r' % name)
@@ -0,0 +1,400 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+from pycouzin.neighborhood import pairwise_distances, nearest_indices, \
+    rank_nearest
+
+
+class NeighborSearch:
+    """
+    Defines a neighbor search over a fixed set of positions. Must be
+    subclassed.
+
+    Parameters
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of positions.
+    cell_size : number
+        The radius most queries will use. Backends may use it to size their
+        internal structure or ignore it.
+
+    Attributes
+    ----------
+    spatial : boolean
+        False if `candidates()` always returns every other agent, in which
+        case callers need not track how far agents moved since the search
+        was built.
+    """
+
+    spatial = True
+
+    def candidates(self, radius, agents=None):
+        """
+        Returns ordered pairs (i, j), i != j, that include every pair within
+        `radius` of each other (and possibly more).
+
+        Parameters
+        ----------
+        radius : number
+        agents : numpy.ndarray or None
+            The indices of the agents i to query, or None (default) for all
+            agents.
+
+        Returns
+        -------
+        i : numpy.ndarray
+        j : numpy.ndarray
+        """
+        raise NotImplementedError()
+
+    def pairs(self, max_radius, min_radius=0, agents=None):
+        """
+        Finds every ordered pair of agents (i, j) at a distance d with
+        min_radius <= d < max_radius.
+
+        Parameters
+        ----------
+        max_radius : number
+        min_radius : number
+            Defaults to 0. A non-zero value gives an annulus query.
+        agents : numpy.ndarray or None
+            The indices of the agents i to query, or None (default) for all
+            agents.
+
+        Returns
+        -------
+        i : numpy.ndarray
+        j : numpy.ndarray
+        d : numpy.ndarray
+            The distance between agents i and j.
+        """
+        i, j = self.candidates(max_radius, agents)
+        dx = self.pos[j, 0] - self.pos[i, 0]
+        dy = self.pos[j, 1] - self.pos[i, 1]
+        d = np.sqrt(dx ** 2 + dy ** 2)
+        keep = (d < max_radius) & (d >= min_radius)
+        return i[keep], j[keep], d[keep]
+
+    def nearest(self, max_k, min_k=0):
+        """
+        Finds the neighbors of every agent ranked min_k (inclusive) to max_k
+        (exclusive) by distance, closest first.
+
+        Parameters
+        ----------
+        max_k : int
+        min_k : int
+
+        Returns
+        -------
+        nearest : numpy.ndarray
+            See `neighborhood.nearest_indices()`.
+        """
+        raise NotImplementedError()
+
+
+class BruteForceSearch(NeighborSearch):
+    """
+    Compares every pair of positions through a dense distance matrix, which
+    is computed once and shared by all queries.
+
+    See `NeighborSearch` for parameters.
+    """
+
+    spatial = False
+
+    def __init__(self, pos, cell_size=None):
+        self.pos = pos
+        self.n = pos.shape[0]
+        self._d = None
+
+    def distances(self):
+        """
+        Returns the nxn distance matrix, see
+        `neighborhood.pairwise_distances()`.
+        """
+        if self._d is None:
+            self._d = pairwise_distances(self.pos)
+        return self._d
+
+    def candidates(self, radius, agents=None):
+        if agents is None:
+            agents = np.arange(self.n)
+        agents = np.asarray(agents, dtype=np.int64)
+        i = np.repeat(agents, self.n)
+        j = np.tile(np.arange(self.n), len(agents))
+        keep = i != j
+        return i[keep], j[keep]
+
+    def pairs(self, max_radius, min_radius=0, agents=None):
+        d = self.distances()
+        if agents is not None:
+            agents = np.asarray(agents, dtype=np.int64)
+            d = d[agents]
+        mask = (d < max_radius) & (d >= min_radius)
+        i, j = np.nonzero(mask)
+        dist = d[i, j]
+        if agents is not None:
+            i = agents[i]
+        keep = i != j
+        return i[keep], j[keep], dist[keep]
+
+    def nearest(self, max_k, min_k=0):
+        return nearest_indices(self.distances(), max_k, min_k)
+
+
+class KDTreeSearch(NeighborSearch):
+    """
+    Searches a `scipy.spatial.cKDTree` built over the positions. Suited to
+    large interaction radii, where a cell list degenerates into a few
+    crowded cells. Requires SciPy.
+
+    See `NeighborSearch` for parameters.
+    """
+
+    def __init__(self, pos, cell_size=None):
+        if cKDTree is None:
+            raise ImportError('The kdtree search requires scipy')
+        self.pos = pos
+        self.n = pos.shape[0]
+        self.tree = cKDTree(pos)
+
+    def candidates(self, radius, agents=None):
+        if agents is None:
+            agents = np.arange(self.n)
+        agents = np.asarray(agents, dtype=np.int64)
+        if len(agents) == 0 or not np.isfinite(radius):
+            return BruteForceSearch.candidates(self, radius, agents)
+        found = self.tree.query_ball_point(self.pos[agents], radius)
+        lengths = np.array([len(f) for f in found], dtype=np.int64)
+        if lengths.sum() == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        i = np.repeat(agents, lengths)
+        j = np.concatenate([np.asarray(f, dtype=np.int64) for f in found])
+        keep = i != j
+        return i[keep], j[keep]
+
+    def pairs(self, max_radius, min_radius=0, agents=None):
+        if agents is not None or not np.isfinite(max_radius):
+            return NeighborSearch.pairs(self, max_radius, min_radius, agents)
+        ij = self.tree.query_pairs(max_radius, output_type='ndarray')
+        i = np.concatenate([ij[:, 0], ij[:, 1]]).astype(np.int64)
+        j = np.concatenate([ij[:, 1], ij[:, 0]]).astype(np.int64)
+        dx = self.pos[j, 0] - self.pos[i, 0]
+        dy = self.pos[j, 1] - self.pos[i, 1]
+        d = np.sqrt(dx ** 2 + dy ** 2)
+        keep = (d < max_radius) & (d >= min_radius)
+        return i[keep], j[keep], d[keep]
+
+    def nearest(self, max_k, min_k=0):
+        max_k = int(max_k)
+        available = min(max_k, self.n - 1)
+        if available <= 0:
+            return np.zeros((self.n, 0), dtype=int)
+        # Ask for one extra neighbor since each agent finds itself
+        _, idx = self.tree.query(self.pos, k=available + 1)
+        idx = idx.reshape(self.n, available + 1)
+        dx = self.pos[idx, 0] - self.pos[:, 0][:, np.newaxis]
+        dy = self.pos[idx, 1] - self.pos[:, 1][:, np.newaxis]
+        d = np.sqrt(dx ** 2 + dy ** 2)
+        d[idx == np.arange(self.n)[:, np.newaxis]] = np.inf
+        # Rows where the agent itself was crowded out by ties lose the
+        # furthest neighbor instead
+        d[np.isfinite(d).all(axis=1), available] = np.inf
+        ranked = rank_nearest(d, max_k, min_k)
+        return np.take_along_axis(idx, ranked, axis=1)
+
+
+class VerletList(NeighborSearch):
+    """
+    A Verlet neighbor list: the pairs of agents within `radius` + `skin` of
+    each other, found once with another search and reused over the
+    following time steps.
+
+    As long as no agent has moved more than skin / 2 since the list was
+    built, every pair currently within `radius` of each other is in the
+    list, so radius queries only need to check the distances of the listed
+    pairs. `refresh()` moves the list to the current positions and reports
+    when it has gone stale and must be rebuilt.
+
+    Parameters
+    ----------
+    search : NeighborSearch
+        A search over the positions at the time the list is built, used to
+        find the listed pairs.
+    radius : number
+        The largest radius the list must answer.
+    skin : number
+        The extra distance agents may move before the list is rebuilt.
+
+    Attributes
+    ----------
+    shift : number
+        The largest distance any agent has moved since the list was built,
+        as of the last `refresh()`.
+    """
+
+    def __init__(self, search, radius, skin):
+        self.radius = radius
+        self.skin = skin
+        self.n = search.n
+        self.search = search
+        self.ref = search.pos.copy()
+        self.pos = self.ref
+        self.shift = 0
+        i, j, _ = search.pairs(radius + skin)
+        order = np.lexsort((j, i))
+        self.i = i[order]
+        self.j = j[order]
+        self._d = None
+
+    def reach(self):
+        """
+        Returns the radius within which the list holds every pair at the
+        current positions.
+        """
+        return self.radius + self.skin - 2 * self.shift
+
+    def refresh(self, pos):
+        """
+        Moves the list to a snapshot of new positions of the same agents.
+
+        Parameters
+        ----------
+        pos : numpy.ndarray
+            An nx2 array of positions.
+
+        Returns
+        -------
+        valid : boolean
+            False if some agent has moved more than skin / 2 since the list
+            was built, in which case the list is left unchanged and must be
+            rebuilt.
+        """
+        if pos.shape[0] != self.n:
+            return False
+        shift = np.sqrt(((pos - self.ref) ** 2).sum(axis=1).max()) \
+            if self.n > 0 else 0
+        if shift > self.skin / 2.0:
+            return False
+        self.pos = pos.copy()
+        self.shift = shift
+        self._d = None
+        return True
+
+    def distances(self):
+        """
+        Returns the distance between the agents of each listed pair at the
+        current positions, computed once per `refresh()`.
+        """
+        if self._d is None:
+            dx = self.pos[self.j, 0] - self.pos[self.i, 0]
+            dy = self.pos[self.j, 1] - self.pos[self.i, 1]
+            self._d = np.sqrt(dx ** 2 + dy ** 2)
+        return self._d
+
+    def candidates(self, radius, agents=None):
+        """
+        Returns the listed pairs, or every pair if `radius` is beyond
+        `reach()`.
+
+        See `NeighborSearch.candidates()`.
+        """
+        if radius > self.reach():
+            return BruteForceSearch.candidates(self, radius, agents)
+        if agents is None:
+            return self.i, self.j
+        agents = np.asarray(agents, dtype=np.int64)
+        lo = np.searchsorted(self.i, agents)
+        hi = np.searchsorted(self.i, agents, side='right')
+        if len(agents) == 1:
+            return self.i[lo[0]:hi[0]], self.j[lo[0]:hi[0]]
+        keep = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)]
+                              + [np.zeros(0, dtype=np.int64)])
+        return self.i[keep], self.j[keep]
+
+    def pairs(self, max_radius, min_radius=0, agents=None):
+        if agents is not None or max_radius > self.reach():
+            return NeighborSearch.pairs(self, max_radius, min_radius, agents)
+        d = self.distances()
+        keep = (d < max_radius) & (d >= min_radius)
+        return self.i[keep], self.j[keep], d[keep]
+
+    def nearest(self, max_k, min_k=0):
+        """
+        Finds the neighbors of every agent ranked min_k (inclusive) to max_k
+        (exclusive) by distance, closest first.
+
+        Agents with at least max_k listed neighbors within `radius` are
+        ranked among those, then the remaining agents among their listed
+        neighbors within `reach()`. For agents still short of neighbors the
+        search radius is doubled beyond `reach()`, looking the candidates up
+        in the search the list was built with, as `CellList.nearest()` does.
+
+        See `NeighborSearch.nearest()`.
+        """
+        max_k, min_k = int(max_k), int(min_k)
+        available = min(max_k, self.n - 1)
+        start = max(available - (max_k - min_k), 0)
+        nearest = np.zeros((self.n, max(available - start, 0)), dtype=int)
+        if nearest.shape[1] == 0:
+            return nearest
+
+        pending = np.ones(self.n, dtype=bool)
+        for radius in (self.radius, self.reach()):
+            i, j, d = self.pairs(radius)
+            keep = pending[i]
+            i, j, d = i[keep], j[keep], d[keep]
+            found = np.bincount(i, minlength=self.n)
+            resolved = pending & (found >= available)
+            pending &= ~resolved
+            if resolved.any():
+                keep = resolved[i]
+                nearest[resolved] = _ranked(i[keep], j[keep], d[keep], start,
+                                            available)
+
+        pending = np.nonzero(pending)[0]
+        span = (self.pos.max(axis=0) - self.pos.min(axis=0)).sum()
+        radius = 2 * max(self.reach(), self.radius, np.finfo(float).tiny)
+        while len(pending) > 0:
+            # Beyond the extent of the agents every agent is a candidate
+            if radius > span:
+                radius = np.inf
+            # Agents within radius of each other now were within
+            # radius + 2 * shift of each other when the list was built
+            i, j = self.search.candidates(radius + 2 * self.shift, pending)
+            dx = self.pos[j, 0] - self.pos[i, 0]
+            dy = self.pos[j, 1] - self.pos[i, 1]
+            d = np.sqrt(dx ** 2 + dy ** 2)
+            keep = d < radius
+            i, j, d = i[keep], j[keep], d[keep]
+            found = np.bincount(i, minlength=self.n)
+            done = found[pending] >= available
+            resolved = pending[done]
+            pending = pending[~done]
+            radius *= 2
+            if len(resolved) > 0:
+                keep = found[i] >= available
+                nearest[resolved] = _ranked(i[keep], j[keep], d[keep], start,
+                                            available)
+        return nearest
+
+
+def _ranked(i, j, d, start, available):
+    """
+    Ranks the pairs (i, j) of each agent i by distance d and returns, for
+    every agent i in increasing order, its neighbors ranked start
+    (inclusive) to available (exclusive). Every agent must have at least
+    `available` pairs.
+    """
+    order = np.lexsort((d, i))
+    i, j = i[order], j[order]
+    first = np.searchsorted(i, i)
+    rank = np.arange(len(i)) - first
+    keep = (rank >= start) & (rank < available)
+    return j[keep].reshape(-1, available - start)
@@ -0,0 +1,187 @@
+import math
+import warnings
+import numpy as np
+from numpy import linalg as la
+
+try:
+    from scipy.sparse import linalg as spla
+except ImportError:
+    spla = None
+
+from pycouzin import graph
+
+
+# Laplacians with more rows than this are solved iteratively when possible
+DENSE_LIMIT = 500
+
+
+def is_symmetric(l):
+    """
+    Returns True if the matrix `l` equals its transpose.
+    """
+    if graph.issparse(l):
+        return (l != l.T).nnz == 0
+    return np.array_equal(l, l.T)
+
+
+def is_laplacian(l):
+    """
+    Returns True if `l` is the laplacian of a graph with non-negative edge
+    weights: no positive entries off the diagonal and rows summing to zero.
+    """
+    if graph.issparse(l):
+        off = l.tocoo()
+        off = off.data[off.row != off.col]
+        sums = np.asarray(l.sum(axis=1)).ravel()
+        scale = np.abs(l.diagonal()).max() if l.shape[0] > 0 else 0
+    else:
+        off = l[~np.eye(l.shape[0], dtype=bool)]
+        sums = l.sum(axis=1)
+        scale = np.abs(np.diag(l)).max() if l.shape[0] > 0 else 0
+    return (off <= 0).all() and \
+        (np.abs(sums) <= 1e-10 * max(scale, 1)).all()
+
+
+def fiedler(laplacian, method='auto', tolerance=None, v0=None):
+    """
+    Computes the Fiedler eigenvalue (the second smallest eigenvalue) of a
+    laplacian.
+
+    The iterative methods never return an unconverged value: if the
+    residual of the eigenpair LOBPCG finds exceeds the tolerance, the value
+    is recomputed with shift-invert Lanczos, and if that fails too, with the
+    dense solver.
+    For the laplacian of a graph, a disconnected graph is detected by
+    labeling its components and gets an exact zero.
+
+    Parameters
+    ----------
+    laplacian : numpy.ndarray or scipy.sparse matrix
+    method : str
+        'dense' solves the full spectrum, with `eigvalsh` for symmetric
+        laplacians and `eig` otherwise. 'lobpcg' and 'lanczos' find only the
+        smallest eigenvalues of a symmetric laplacian iteratively (with
+        `scipy.sparse.linalg.lobpcg` and shift-invert `eigsh` respectively).
+        'auto' (default) uses 'lobpcg' for graph laplacians (see
+        `is_laplacian()`) that are symmetric and either sparse or larger
+        than DENSE_LIMIT when SciPy is available, and 'dense' otherwise.
+    tolerance : number or None
+        The largest residual norm |Lv - wv| accepted from the iterative
+        methods, which also bounds the error of the eigenvalue. Defaults to
+        None, for 1e-8 times the largest diagonal entry. Tighter tolerances
+        allow more iterations before falling back.
+    v0 : numpy.ndarray or None
+        A starting guess for the Fiedler vector of the iterative methods,
+        typically the vector returned for the previous time step.
+
+    Returns
+    -------
+    value : number
+        The Fiedler eigenvalue. Complex only for asymmetric laplacians with
+        complex eigenvalues.
+    vector : numpy.ndarray or None
+        The Fiedler vector when an iterative method was used, else None.
+    """
+    n = laplacian.shape[0]
+    if method == 'auto':
+        large = graph.issparse(laplacian) or n > DENSE_LIMIT
+        if spla is not None and large and n > 10 and \
+                is_symmetric(laplacian) and is_laplacian(laplacian):
+            method = 'lobpcg'
+        else:
+            method = 'dense'
+
+    if method == 'dense':
+        return _dense(laplacian), None
+    if method not in ('lobpcg', 'lanczos'):
+        raise ValueError('Unknown Fiedler solver %r' % method)
+    if spla is None:
+        raise ImportError('The %s Fiedler solver requires scipy' % method)
+
+    if graph.issparse(laplacian):
+        scale = np.abs(laplacian.diagonal()).max()
+    else:
+        scale = np.abs(np.diag(laplacian)).max()
+    tol = tolerance if tolerance is not None else 1e-8 * max(scale, 1)
+    if v0 is None or len(v0) != n:
+        v0 = np.random.RandomState(0).standard_normal(n)
+
+    deflate = is_laplacian(laplacian)
+    if deflate:
+        count, labels = graph.components(laplacian)
+        if count > 1:
+            # Every component adds a zero eigenvalue, with the indicator
+            # of the component (made orthogonal to the constant vector) as
+            # an eigenvector
+            v = (labels == labels[0]) - np.mean(labels == labels[0])
+            return 0.0, v / la.norm(v)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        w, v = np.nan, None
+        if method == 'lobpcg':
+            w, v = _lobpcg(laplacian, v0, tol, scale, deflate)
+        if _residual(laplacian, w, v) > tol:
+            w, v = _shift_invert(laplacian, v0, tol, scale, deflate)
+    if v is None or _residual(laplacian, w, v) > tol:
+        return _dense(laplacian), None
+    return w, v
+
+
+def _dense(laplacian):
+    if graph.issparse(laplacian):
+        laplacian = laplacian.toarray()
+    if is_symmetric(laplacian):
+        return la.eigvalsh(laplacian)[1]
+    w = la.eig(laplacian)[0]
+    w.sort()
+    return w[1]
+
+
+def _residual(laplacian, w, v):
+    if v is None:
+        return np.inf
+    return la.norm(laplacian.dot(v) - w * v) / la.norm(v)
+
+
+def _lobpcg(laplacian, v0, tol, scale, deflate):
+    n = laplacian.shape[0]
+    # Allow more iterations the tighter the tolerance is
+    digits = max(math.log10(max(scale, 1) / tol), 1)
+    maxiter = max(200, int(50 * digits))
+    x = np.column_stack([v0, np.random.RandomState(1).standard_normal(n)])
+    if deflate:
+        # The constant vector spans the null space of a connected graph's
+        # laplacian, so the Fiedler pair is the smallest one orthogonal to
+        # it
+        y = np.ones((n, 1)) / np.sqrt(n)
+        w, v = spla.lobpcg(laplacian, x, Y=y, tol=tol, maxiter=maxiter,
+                           largest=False)
+        k = 0
+    else:
+        w, v = spla.lobpcg(laplacian, x, tol=tol, maxiter=maxiter,
+                           largest=False)
+        k = 1
+    order = np.argsort(w)
+    return w[order[k]], v[:, order[k]]
+
+
+def _shift_invert(laplacian, v0, tol, scale, deflate):
+    # A shift just below the spectrum makes the smallest eigenvalues the
+    # largest ones of the inverse, so they are found in order
+    if deflate:
+        sigma = -1e-3 * max(scale, 1)
+    else:
+        # Gershgorin's bound on the smallest eigenvalue
+        diag = laplacian.diagonal()
+        off = np.asarray(abs(laplacian).sum(axis=1)).ravel() - np.abs(diag)
+        sigma = (diag - off).min() - 1e-3 * max(scale, 1)
+    if graph.issparse(laplacian):
+        laplacian = laplacian.tocsc()
+    try:
+        w, v = spla.eigsh(laplacian, k=2, sigma=sigma, which='LM', v0=v0,
+                          tol=tol)
+    except (spla.ArpackNoConvergence, RuntimeError):
+        return np.nan, None
+    order = np.argsort(w)
+    return w[order[1]], v[:, order[1]]
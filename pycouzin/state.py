@@ -0,0 +1,102 @@
+import numpy as np
+
+
+# Type codes of the `kind` array of AgentState
+AGENT, PREY, PREDATOR, DEAD = 0, 1, 2, 3
+
+# The default name, speed, maximum turning angle and plot color of each
+# kind, copied into `Board.kinds`
+KINDS = {
+    AGENT: {'name': 'Agent', 'speed': 0.5, 'thetamax': 0.05, 'color': 'b'},
+    PREY: {'name': 'Prey', 'speed': 0.5, 'thetamax': 0.05, 'color': 'c'},
+    PREDATOR: {'name': 'Predator', 'speed': 1.0, 'thetamax': 0.20,
+               'color': 'r'},
+    DEAD: {'name': 'Dead', 'speed': 0, 'thetamax': 0, 'color': 'k'},
+}
+
+
+class AgentState:
+    """
+    Contiguous storage for the state of a group of agents.
+
+    Row i of every array holds the state of the agent with index i.
+
+    Parameters
+    ----------
+    n : int
+        The number of agents to allocate storage for.
+
+    Attributes
+    ----------
+    pos : numpy.ndarray
+        An nx2 array of agent positions.
+    ori : numpy.ndarray
+        An nx2 array of agent orientations.
+    speed : numpy.ndarray
+        A length n array of agent speeds.
+    thetamax : numpy.ndarray
+        A length n array of maximum turning angles per time step.
+    kind : numpy.ndarray
+        A length n array of agent type codes: AGENT, PREY, PREDATOR or
+        DEAD.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.pos = np.zeros((n, 2))
+        self.ori = np.zeros((n, 2))
+        self.speed = np.zeros(n)
+        self.thetamax = np.zeros(n)
+        self.kind = np.zeros(n, dtype=np.int8)
+        self._next = None
+
+    def copy_row(self, i, other, j):
+        """
+        Copies row j of `other` into row i of this state.
+
+        Parameters
+        ----------
+        i : int
+        other : AgentState
+        j : int
+        """
+        self.pos[i] = other.pos[j]
+        self.ori[i] = other.ori[j]
+        self.speed[i] = other.speed[j]
+        self.thetamax[i] = other.thetamax[j]
+        self.kind[i] = other.kind[j]
+
+    def next_buffer(self):
+        """
+        Starts a synchronous step by returning the buffer that agents write
+        their step t+1 state into, while this state keeps holding step t.
+
+        The buffer is allocated once and reused. Its positions and
+        orientations start as a copy of this state's; the per-agent
+        parameters (speed, thetamax and kind) are shared rather than copied.
+
+        Returns
+        -------
+        next : AgentState
+        """
+        if self._next is None or self._next.n != self.n:
+            self._next = AgentState(0)
+            self._next.n = self.n
+            self._next.pos = np.empty_like(self.pos)
+            self._next.ori = np.empty_like(self.ori)
+        nxt = self._next
+        nxt.speed = self.speed
+        nxt.thetamax = self.thetamax
+        nxt.kind = self.kind
+        nxt.pos[:] = self.pos
+        nxt.ori[:] = self.ori
+        return nxt
+
+    def swap(self):
+        """
+        Ends a synchronous step by exchanging the positions and orientations
+        of this state with those of its next buffer, see `next_buffer()`.
+        """
+        nxt = self._next
+        self.pos, nxt.pos = nxt.pos, self.pos
+        self.ori, nxt.ori = nxt.ori, self.ori
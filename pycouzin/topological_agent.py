@@ -9,9 +9,13 @@ class TopologicalAgent(Agent):
     and attraction.
 
     See `Agent` for initialization.
+
+    Boards created with `vectorize=True` update these agents all at once
+    with `kernels.zone_directions()`.
     """
 
-    color = 'b'
+    batch_rule = 'zones'
+    noise_std = 0.01
 
     def get_desired_direction(self, a_r, a_o, a_a, a_k, agents):
         """
@@ -27,7 +31,7 @@ class TopologicalAgent(Agent):
         """
         Computes desired direction from zones
         """
-        noise_vec = Vector2D.noisy(0.0, 0.01)
+        noise_vec = self.noise_vector(self.noise_std)
         if len(in_r) > 0:
             # agents in zone of repulsion, ignore orientation and attraction
             d_r = Vector2D(0, 0)
@@ -66,9 +70,20 @@ class TopologicalAgent(Agent):
         See `Agent.update()`
         """
         d = self.get_desired_direction(a_r, a_o, a_a, a_k, agents)
+        self.move(d)
+
+    def move(self, d):
+        """
+        Turns this agent towards the desired direction d, as far as its
+        maximum turning angle allows, and moves it forward.
+
+        Parameters
+        ----------
+        d : Vector2D
+        """
         d = self.reg_ang_v(d)
         self.o = d
-        self.p += self.o * self.speed
+        self.state.pos[self.row] += self.state.ori[self.row] * self.speed
 
     def reg_ang_v(self, d_i):
         """
@@ -1,5 +1,4 @@
 import math
-from random import normalvariate
 
 
 class Vector2D:
@@ -78,7 +77,3 @@ class Vector2D:
         """
         self.x = math.cos(a_des)
         self.y = math.sin(a_des)
-
-    @staticmethod
-    def noisy(mean, std):
-        return Vector2D(normalvariate(mean, std), normalvariate(mean, std))
@@ -1,8 +1,9 @@
+from functools import partial
 import numpy as np
-import pandas as pd
 
 from pycouzin.agent import Agent
 from pycouzin.board import Board
+from pycouzin.replicates import run_replicates
 
 
 def init_agents(board):
@@ -13,11 +14,14 @@ def init_agents(board):
     return agents
 
 
-def run_sim(r, n=50, m=10):
-    board = Board(n, m, init_agents)
+def make_board(r, seed, n=50, m=10):
+    return Board(n, m, init_agents, seed=seed)
+
+
+def is_connected(board, r):
     A = board.radius_adjacency(r)
     L = board.laplacian(A)
-    return board.is_connected(L)
+    return int(board.is_connected(L))
 
 
 if __name__ == '__main__':
@@ -27,18 +31,9 @@ if __name__ == '__main__':
     reps = 100
     step = 0.5
     radii = np.arange(0, 10 + step, step)
-    data = {}
-    for r in radii:
-        rix = r / float(m)
-        data[rix] = {}
-        for rep in range(reps):
-            rs = run_sim(r, n, m)
-            x = 0
-            if rs:
-                x = 1
-            data[rix][rep] = x
-    data = pd.DataFrame(data).transpose()
+    data = run_replicates(partial(make_board, n=n, m=m), is_connected, radii,
+                          reps, seed=0, labels=radii / float(m))
     data['Summary'] = data.sum(axis=1)
     data['Summary'] = data['Summary'] * 100 / float(reps)
-    print data['Summary']
+    print(data['Summary'])
     data.to_csv('1_1_results.csv')
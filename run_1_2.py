@@ -1,8 +1,9 @@
+from functools import partial
 import numpy as np
-import pandas as pd
 
 from pycouzin.agent import Agent
 from pycouzin.board import Board
+from pycouzin.replicates import run_replicates
 
 
 def init_agents(board):
@@ -13,11 +14,14 @@ def init_agents(board):
     return agents
 
 
-def run_sim(k, n=50, m=10):
-    board = Board(n, m, init_agents)
+def make_board(k, seed, n=50, m=10):
+    return Board(n, m, init_agents, seed=seed)
+
+
+def is_connected(board, k):
     A = board.nearest_adjacency(k)
     L = board.laplacian(A)
-    return board.is_connected(L)
+    return int(board.is_connected(L))
 
 
 if __name__ == '__main__':
@@ -25,18 +29,9 @@ if __name__ == '__main__':
     n = 30
     reps = 100
     ks = np.arange(1, n + 1)
-    data = {}
-    for k in ks:
-        data[k] = {}
-        print k
-        for rep in range(reps):
-            rs = run_sim(k, n, m)
-            x = 0
-            if rs:
-                x = 1
-            data[k][rep] = x
-    data = pd.DataFrame(data).transpose()
+    data = run_replicates(partial(make_board, n=n, m=m), is_connected, ks,
+                          reps, seed=0)
     data['Summary'] = data.sum(axis=1)
     data['Summary'] = data['Summary'] * 100 / float(reps)
-    print data['Summary']
+    print(data['Summary'])
     data.to_csv('1_2_results.csv')
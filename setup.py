@@ -25,10 +25,18 @@ setup(
     packages=['pycouzin'],
     scripts=[],
     include_package_data=True,
+    python_requires='>=3',
     install_requires=[
         'pandas',
         'numpy'
     ],
+    extras_require={
+        # Sparse matrices, the kdtree search and the iterative Fiedler
+        # solvers
+        'scipy': ['scipy'],
+        # The live view and the offline renderer
+        'plot': ['matplotlib'],
+    },
     tests_require=[
         'pytest'
     ],
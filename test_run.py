@@ -44,7 +44,7 @@ if __name__ == '__main__':
     board = CouzinBoard(n, m, agent_r, rr, ro, ra, k)
     agent = board.agents[0]
     d = agent.reg_ang_v(Vector2D(-0.951, 0.309))
-    print "d: "
+    print("d: ")
     print(d)
     board.update()
     assert agent.p == Vector2D(-0.1, -0.1)
@@ -0,0 +1,15 @@
+import pytest
+
+from pycouzin import graph
+from pycouzin.board import SEARCHES
+
+
+# Marks the tests, and the parameters of tests, that need SciPy, which is
+# an optional dependency of pycouzin
+requires_scipy = pytest.mark.skipif(graph.sparse is None,
+                                    reason='requires scipy')
+
+# The neighbor search backends and sparse flags to parametrize tests with
+BACKENDS = [pytest.param(name, marks=requires_scipy) if name == 'kdtree'
+            else name for name in sorted(SEARCHES)]
+SPARSE = [False, pytest.param(True, marks=requires_scipy)]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from pycouzin import graph
+from pycouzin.board import Board
+from tests import SPARSE
+
+
+def adjacency(n, edges, sparse):
+    i, j = np.array(edges).T
+    return graph.adjacency_matrix(i, j, n, as_sparse=sparse)
+
+
+# 0 -> 1 <-> 2 <-> 3: agent 0 reaches the closed component {1, 2, 3}
+# without being part of it, so the graph has a spanning tree
+ONE_WAY = (4, [(0, 1), (1, 2), (2, 1), (2, 3), (3, 2)])
+# 0 <-> 1 and 2 <-> 3
+PAIRS = (4, [(0, 1), (1, 0), (2, 3), (3, 2)])
+# 1 <- 0 -> 2: two closed components that never hear from each other
+FORK = (3, [(0, 1), (0, 2)])
+
+
+@pytest.fixture(params=['csgraph', 'kosaraju'])
+def traversal(request, monkeypatch):
+    if request.param == 'csgraph':
+        if graph.csgraph is None:
+            pytest.skip('requires scipy')
+    else:
+        monkeypatch.setattr(graph, 'csgraph', None)
+    return request.param
+
+
+@pytest.mark.parametrize('sparse', SPARSE)
+@pytest.mark.parametrize('network, closed, strong, sizes', [
+    (ONE_WAY, 1, 2, [4]),
+    (PAIRS, 2, 2, [2, 2]),
+    (FORK, 2, 3, [3]),
+])
+def test_components(traversal, sparse, network, closed, strong, sizes):
+    n, edges = network
+    a = adjacency(n, edges, sparse)
+    l = graph.laplacian(a)
+    board = Board.from_arrays(np.zeros((n, 2)), sparse=sparse)
+
+    assert graph.closed_components(l) == closed
+    assert graph.components(a, 'strong')[0] == strong
+    count, found = board.components(a)
+    assert count == len(sizes)
+    np.testing.assert_array_equal(found, sizes)
+    np.testing.assert_array_equal(board.components(l)[1], sizes)
+
+    assert board.is_connected(l) == (closed == 1)
+    if not sparse:
+        # The closed components count the zero eigenvalues
+        assert board.is_connected(l, method='spectral') == (closed == 1)
+
+
+def test_components_of_isolated_agents(traversal):
+    board = Board.from_arrays(np.zeros((3, 2)))
+    count, sizes = board.components(np.zeros((3, 3)))
+    assert count == 3
+    np.testing.assert_array_equal(sizes, [1, 1, 1])
+    assert graph.closed_components(np.zeros((3, 3))) == 3
+
+
+def test_unknown_connectivity_method():
+    board = Board.from_arrays(np.zeros((2, 2)))
+    with pytest.raises(ValueError):
+        board.is_connected(np.zeros((2, 2)), method='eigen')
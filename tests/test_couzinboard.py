@@ -0,0 +1,255 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pycouzin.couzinboard import CouzinBoard, FIEDLER_KEYS
+from pycouzin.nearest_agent import NearestAgent
+from pycouzin.predprey_agent import PredatorAgent, PreyAgent
+from pycouzin.schedule import MetricSchedule
+from pycouzin.topological_agent import TopologicalAgent
+from pycouzin.vector import Vector2D
+from tests import BACKENDS, SPARSE
+
+
+def topological(board):
+    return [TopologicalAgent(board) for _ in range(board.n)]
+
+
+def nearest(board):
+    return [NearestAgent(board) for _ in range(board.n)]
+
+
+def predator_prey(board):
+    return [PredatorAgent(board) if i % 20 == 0 else PreyAgent(board)
+            for i in range(board.n)]
+
+
+AGENTS = [topological, nearest, predator_prey]
+
+
+def make_board(agent_init, n=60, **kwargs):
+    kwargs.setdefault('seed', 7)
+    return CouzinBoard(n, 10, agent_init, 1, 2, 23, 5, **kwargs)
+
+
+def permuted(board, perm, **kwargs):
+    """
+    Builds a board with the agents of `board` in the order `perm`: agent i
+    of the new board starts as agent perm[i] of `board`, and gets its noise
+    at every step.
+    """
+    pos = board.state.pos[perm]
+    ori = board.state.ori[perm]
+
+    def agent_init(b):
+        return [type(board.agents[p])(b, Vector2D(*pos[i]),
+                                      Vector2D(*ori[i]))
+                for i, p in enumerate(perm)]
+    other = make_board(agent_init, board.n, **kwargs)
+
+    def draw_noise():
+        other.noise = board.noise[perm]
+        return other.noise
+    other.draw_noise = draw_noise
+    return other
+
+
+@pytest.mark.parametrize('agent_init', AGENTS)
+@pytest.mark.parametrize('vectorize', [False, True])
+def test_synchronous_updates_do_not_depend_on_agent_order(agent_init,
+                                                          vectorize):
+    kwargs = dict(update_mode='synchronous', vectorize=vectorize)
+    board = make_board(agent_init, **kwargs)
+    perm = np.random.default_rng(0).permutation(board.n)
+    other = permuted(board, perm, **kwargs)
+    for _ in range(30):
+        board.step()
+        other.step()
+    np.testing.assert_allclose(other.state.pos, board.state.pos[perm],
+                               rtol=0, atol=1e-9)
+    np.testing.assert_allclose(other.state.ori, board.state.ori[perm],
+                               rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(other.state.kind, board.state.kind[perm])
+    assert sorted((s, perm[i], old, new)
+                  for s, i, old, new in other.transitions) == \
+        sorted(board.transitions)
+
+
+def test_sequential_updates_depend_on_agent_order():
+    board = make_board(topological)
+    other = permuted(board, np.arange(board.n)[::-1])
+    for _ in range(30):
+        board.step()
+        other.step()
+    assert not np.allclose(other.state.pos, board.state.pos[::-1])
+
+
+def test_synchronous_step_reads_the_state_at_the_start_of_the_step():
+    board = make_board(topological, update_mode='synchronous')
+    pos = board.state.pos.copy()
+    ori = board.state.ori.copy()
+    board.step()
+    moved = board.state.pos - pos
+    # Every agent moved by its speed along its new heading from where it
+    # started, no matter when in the step it was updated
+    np.testing.assert_allclose(
+        moved, board.state.ori * board.state.speed[:, np.newaxis],
+        rtol=0, atol=1e-12)
+    assert not np.allclose(board.state.ori, ori)
+
+
+@pytest.mark.parametrize('agent_init', AGENTS)
+@pytest.mark.parametrize('search', BACKENDS)
+@pytest.mark.parametrize('sparse', SPARSE)
+def test_verlet_skin_does_not_change_the_run(agent_init, search, sparse):
+    runs = []
+    for skin in (0, 5):
+        board = make_board(agent_init, search=search, sparse=sparse,
+                           vectorize=True, skin=skin)
+        board.metrics.only('combined')
+        records = board.simulate(30)
+        runs.append((board, records))
+    (exact, exact_records), (skinned, skinned_records) = runs
+    np.testing.assert_array_equal(skinned.state.pos, exact.state.pos)
+    np.testing.assert_array_equal(skinned.state.ori, exact.state.ori)
+    np.testing.assert_array_equal(skinned.state.kind, exact.state.kind)
+    assert skinned.transitions == exact.transitions
+    pd.testing.assert_frame_equal(skinned_records, exact_records)
+    assert exact.index_builds == 30
+    assert skinned.index_builds < 30
+
+
+@pytest.mark.parametrize('update_mode', ['sequential', 'synchronous'])
+def test_verlet_skin_with_per_agent_updates(update_mode):
+    boards = [make_board(predator_prey, search='cells', skin=skin,
+                         update_mode=update_mode) for skin in (0, 5)]
+    for board in boards:
+        for _ in range(20):
+            board.step()
+    np.testing.assert_array_equal(boards[1].state.pos, boards[0].state.pos)
+    np.testing.assert_array_equal(boards[1].state.kind,
+                                  boards[0].state.kind)
+    assert boards[1].index_builds < 20
+
+
+class SlowPreyAgent(PreyAgent):
+    """
+    Prey with dynamics of their own, which have no batched kernel.
+    """
+
+    def get_desired_direction(self, a_r, a_o, a_a, a_k, agents):
+        d = PreyAgent.get_desired_direction(self, a_r, a_o, a_a, a_k,
+                                            agents)
+        self.speed = self.speed * 0.5
+        return d
+
+
+def mixed(board):
+    return [SlowPreyAgent(board) if i % 3 == 0 else a
+            for i, a in enumerate(predator_prey(board))]
+
+
+@pytest.mark.parametrize('agent_init', AGENTS + [mixed])
+def test_vectorized_updates_match_per_agent_updates(agent_init):
+    boards = [make_board(agent_init, update_mode='synchronous',
+                         vectorize=vectorize) for vectorize in (False, True)]
+    for _ in range(40):
+        for board in boards:
+            board.step()
+        np.testing.assert_allclose(boards[1].state.pos, boards[0].state.pos,
+                                   rtol=0, atol=1e-9)
+    per_agent, vectorized = boards
+    np.testing.assert_allclose(vectorized.state.ori, per_agent.state.ori,
+                               rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(vectorized.state.speed,
+                                  per_agent.state.speed)
+    np.testing.assert_array_equal(vectorized.state.kind, per_agent.state.kind)
+    assert vectorized.transitions == per_agent.transitions
+    if agent_init in (predator_prey, mixed):
+        assert per_agent.transitions
+
+
+
+def test_metric_schedule_registry():
+    schedule = MetricSchedule()
+    schedule.register('a', lambda board, nb: 1)
+    schedule.register('b', lambda board, nb: 2, every=3)
+    schedule.register('c', lambda board, nb: 3, enabled=False)
+    assert schedule.names == ['a', 'b', 'c']
+    assert [schedule.every(name) for name in 'abc'] == [1, 3, 0]
+    # Replacing a metric keeps its place
+    schedule.register('a', lambda board, nb: 4)
+    assert schedule.names == ['a', 'b', 'c']
+    assert schedule.evaluate(None, None, ['a']) == {'a': 4}
+
+    schedule.enable('c', every=2)
+    schedule.disable('a')
+    assert [schedule.every(name) for name in 'abc'] == [0, 3, 2]
+    assert [schedule.due(step) for step in range(7)] == [
+        ['b', 'c'], [], ['c'], ['b'], ['c'], [], ['b', 'c']]
+
+    # only() keeps the sampling of enabled metrics
+    schedule.only('a', 'b')
+    assert [schedule.every(name) for name in 'abc'] == [1, 3, 0]
+    schedule.only()
+    assert schedule.due(0) == []
+    for method in (schedule.enable, schedule.disable, schedule.every,
+                   schedule.only):
+        with pytest.raises(KeyError):
+            method('d')
+    with pytest.raises(KeyError):
+        schedule.evaluate(None, None, ['d'])
+
+
+def test_metric_schedule_flattens_dicts():
+    schedule = MetricSchedule()
+    schedule.register('stats', lambda board, nb: {'x': 1, 'y': 2})
+    schedule.register('value', lambda board, nb: board)
+    assert schedule.evaluate(5, None, ['stats', 'value']) == \
+        {'stats_x': 1, 'stats_y': 2, 'value': 5}
+
+
+def test_board_metrics_follow_the_schedule():
+    board = make_board(topological, vectorize=True)
+    assert board.metrics.names == list(FIEDLER_KEYS) + ['connected',
+                                                        'order']
+    board.metrics.only('attraction', 'connected', 'order')
+    board.metrics.enable('connected', every=3)
+    board.metrics.enable('order', every=4)
+    records = board.simulate(9)
+    assert list(records.index) == list(range(9))
+    assert records['attraction'].notnull().all()
+    assert records.index[records['connected'].notnull()].tolist() == \
+        [0, 3, 6]
+    assert records.index[records['order_polarization'].notnull()] \
+        .tolist() == [0, 4, 8]
+    assert 'repulsion' not in records
+    assert {'order_milling', 'order_largest_cluster'} <= set(records)
+
+    # Steps where nothing is due are left out
+    board.metrics.only('connected')
+    records = board.simulate(5)
+    assert list(records.index) == [9, 12]
+    fiedler = board.update()
+    assert fiedler == (None,) * len(FIEDLER_KEYS)
+    assert board.record == {}
+    nb = board.neighborhood()
+    assert set(board.measure(nb, names=['nearest'])) == {'nearest'}
+    assert set(board.measure(nb)) == {'connected'}
+
+
+def test_fiedler_plot_draws_samples_at_their_steps():
+    pytest.importorskip('matplotlib')
+    from matplotlib.figure import Figure
+    from pycouzin.couzinboard import FiedlerPlot
+
+    plot = FiedlerPlot(Figure().add_subplot(), 'Attraction', 'g', 10)
+    for i, value in zip([0, 3, 6, 9], [0.5, 1.5, 1.0, 2.0]):
+        plot.update(i, value)
+    x, y = plot.eplot.get_data()
+    np.testing.assert_array_equal(x, [1, 4, 7, 10])
+    np.testing.assert_array_equal(y, [0.5, 1.5, 1.0, 2.0])
+    assert plot.average == pytest.approx(1.25)
+    assert plot.max == 2.0
+    x, y = plot.aplot.get_data()
+    np.testing.assert_array_equal(x, [1, 10])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from numpy import linalg as la
+
+from pycouzin.agent import Agent
+from pycouzin.dyn_board import DynBoard
+from pycouzin.metric import Metric
+from tests import requires_scipy
+
+
+def init_agents(board):
+    return [Agent(board) for _ in range(board.n)]
+
+
+def make_board(n, metric, sparse, search='brute'):
+    return DynBoard(n, 10, init_agents, 5, 8, 5.1, metric, search=search,
+                    sparse=sparse, seed=3)
+
+
+@requires_scipy
+@pytest.mark.parametrize('metric', [Metric.radius, Metric.nearest])
+@pytest.mark.parametrize('n', [45, 600])
+def test_comb_fied_is_the_same_for_sparse_and_dense(metric, n):
+    dense = make_board(n, metric, False)
+    sparse = make_board(n, metric, True, 'kdtree')
+    for board in (dense, sparse):
+        board.fiedler_method = 'lobpcg'
+    for _ in range(3):
+        expected = dense.get_comb_fied()
+        np.testing.assert_allclose(sparse.get_comb_fied(), expected,
+                                   rtol=1e-10, atol=1e-10)
+        dense.update()
+        sparse.update()
+
+
+@requires_scipy
+def test_comb_fied_is_the_second_smallest_eigenvalue():
+    board = make_board(600, Metric.radius, True, 'kdtree')
+    l = (board.rep_lap - board.att_lap).toarray()
+    assert board.get_comb_fied() == pytest.approx(la.eigvalsh(l)[1],
+                                                  rel=1e-12)
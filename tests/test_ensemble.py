@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from pycouzin import graph, rng
+from pycouzin.agent import Agent
+from pycouzin.board import Board
+from pycouzin.ensemble import EnsembleBoard
+from tests import SPARSE
+
+
+REPS = 4
+N = 30
+
+
+def ensemble_positions(seed=0):
+    pos = np.random.default_rng(seed).uniform(-2, 2, (REPS, N, 2))
+    # The last replicate is split into two groups far apart
+    pos[-1, N // 2:] += 100
+    return pos
+
+
+def dense(a):
+    return a.toarray() if graph.issparse(a) else np.asarray(a)
+
+
+@pytest.fixture
+def boards(request):
+    """
+    An ensemble and a `Board` per replicate holding the same positions.
+    """
+    pos = ensemble_positions()
+    ensemble = EnsembleBoard(REPS, N, 2, pos=pos)
+    return ensemble, [Board.from_arrays(p, m=2, sparse=request.param)
+                      for p in pos]
+
+
+def test_seeded_ensemble_matches_seeded_boards():
+    ensemble = EnsembleBoard(REPS, N, 10, seed=3)
+    for r, seed in enumerate(rng.spawn(3, REPS)):
+        board = Board(N, 10, lambda b: [Agent(b) for _ in range(N)],
+                      seed=seed)
+        np.testing.assert_array_equal(ensemble.pos[r], board.state.pos)
+        np.testing.assert_allclose(ensemble.ori[r], board.state.ori,
+                                   rtol=0, atol=1e-15)
+
+
+@pytest.mark.parametrize('boards', SPARSE, indirect=True)
+@pytest.mark.parametrize('max_radius, min_radius', [(2, 0), (3, 1), (0, 0)])
+def test_radius_adjacency_matches_board(boards, max_radius, min_radius):
+    ensemble, singles = boards
+    a = ensemble.radius_adjacency(max_radius, min_radius)
+    assert a.shape == (REPS, N, N)
+    for r, board in enumerate(singles):
+        np.testing.assert_array_equal(
+            a[r], dense(board.radius_adjacency(max_radius, min_radius)))
+
+
+@pytest.mark.parametrize('boards', SPARSE, indirect=True)
+@pytest.mark.parametrize('bidirectional', [False, True])
+@pytest.mark.parametrize('max_k, min_k', [(1, 0), (4, 0), (6, 2)])
+def test_nearest_adjacency_matches_board(boards, bidirectional, max_k,
+                                         min_k):
+    ensemble, singles = boards
+    a = ensemble.nearest_adjacency(max_k, min_k, bidirectional)
+    for r, board in enumerate(singles):
+        board.bidirectional = bidirectional
+        np.testing.assert_array_equal(
+            a[r], dense(board.nearest_adjacency(max_k, min_k)))
+
+
+@pytest.mark.parametrize('boards', SPARSE, indirect=True)
+@pytest.mark.parametrize('adjacency', ['radius', 'nearest'])
+def test_laplacian_fiedler_and_connectivity_match_board(boards, adjacency):
+    ensemble, singles = boards
+    if adjacency == 'radius':
+        a = ensemble.radius_adjacency(2)
+        single = [board.radius_adjacency(2) for board in singles]
+    else:
+        a = ensemble.nearest_adjacency(3)
+        single = [board.nearest_adjacency(3) for board in singles]
+    l = ensemble.laplacian(a)
+    fied = ensemble.get_fied(l)
+    connected = ensemble.is_connected(l)
+    spectral = ensemble.is_connected(l, method='spectral')
+
+    for r, board in enumerate(singles):
+        board_l = board.laplacian(single[r])
+        np.testing.assert_allclose(l[r], dense(board_l), rtol=0, atol=0)
+        assert fied[r] == pytest.approx(board.get_fied(board_l), abs=1e-9)
+        assert connected[r] == board.is_connected(board_l)
+        assert spectral[r] == board.is_connected(board_l,
+                                                 method='spectral')
+    # The split replicate is disconnected; at radius 2 the others are not
+    assert not connected[-1]
+    assert abs(fied[-1]) < 1e-9
+    if adjacency == 'radius':
+        assert connected[:-1].all()
+
+
+def test_one_way_edges_are_connected_with_a_spanning_tree():
+    # 0 -> 1 <-> 2 has a spanning tree, 1 <- 0 -> 2 does not
+    a = np.zeros((2, 3, 3))
+    a[0, 0, 1] = a[0, 1, 2] = a[0, 2, 1] = 1
+    a[1, 0, 1] = a[1, 0, 2] = 1
+    ensemble = EnsembleBoard(2, 3, 1, pos=np.zeros((2, 3, 2)))
+    l = ensemble.laplacian(a)
+    assert ensemble.is_connected(l).tolist() == [True, False]
+    assert ensemble.is_connected(l, method='spectral').tolist() == \
+        [True, False]
+    with pytest.raises(ValueError):
+        ensemble.is_connected(l, method='eigen')
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from pycouzin import graph, order
+from pycouzin.neighborhood import pairwise_distances
+from tests import BACKENDS
+
+
+def circle(n=24, radius=5, center=(3, -2)):
+    angle = 2 * np.pi * np.arange(n) / n
+    pos = np.column_stack([np.cos(angle), np.sin(angle)]) * radius + center
+    tangent = np.column_stack([-np.sin(angle), np.cos(angle)])
+    return pos, tangent
+
+
+def test_polarization_of_aligned_and_disordered_headings():
+    pos, tangent = circle()
+    aligned = np.tile([[3.0, 4.0]], (24, 1)) * np.arange(1, 25)[:, None]
+    assert order.polarization(aligned) == pytest.approx(1)
+    assert order.polarization(tangent) == pytest.approx(0, abs=1e-12)
+    opposite = np.array([[1.0, 0], [-2.0, 0], [0, 1], [0, -1]])
+    assert order.polarization(opposite) == pytest.approx(0, abs=1e-12)
+
+
+def test_milling_of_circling_and_aligned_groups():
+    pos, tangent = circle()
+    assert order.milling(pos, tangent) == pytest.approx(1)
+    assert order.milling(pos, -tangent) == pytest.approx(1)
+    aligned = np.tile([[1.0, 0]], (24, 1))
+    assert order.milling(pos, aligned) == pytest.approx(0, abs=1e-12)
+    # Half the group circles each way
+    mixed = tangent * np.where(np.arange(24) % 2, 1, -1)[:, None]
+    assert order.milling(pos, mixed) == pytest.approx(0, abs=1e-12)
+
+
+def test_centroid_and_extent():
+    pos, _ = circle()
+    np.testing.assert_allclose(order.centroid(pos), [3, -2], atol=1e-12)
+    gyration, radius = order.extent(pos)
+    assert gyration == pytest.approx(5)
+    assert radius == pytest.approx(5)
+
+
+def positions(n=200, seed=0):
+    return np.random.default_rng(seed).uniform(-10, 10, (n, 2))
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+def test_nearest_distances_match_brute_force(search):
+    pos = positions()
+    d = pairwise_distances(pos)
+    np.fill_diagonal(d, np.inf)
+    expected = d.min(axis=1)
+    np.testing.assert_allclose(order.nearest_distances(pos, search),
+                               expected, rtol=1e-12)
+    stats = order.nearest_stats(pos, search)
+    assert stats['mean'] == pytest.approx(expected.mean())
+    assert stats['std'] == pytest.approx(expected.std())
+    assert stats['min'] == pytest.approx(expected.min())
+    assert stats['max'] == pytest.approx(expected.max())
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+def test_nearest_distances_of_few_agents(search):
+    assert order.nearest_distances(np.zeros((1, 2)), search).tolist() == \
+        [np.inf]
+    pos = np.array([[0.0, 0], [0, 0], [3, 4]])
+    np.testing.assert_allclose(order.nearest_distances(pos, search),
+                               [0, 0, 5])
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+def test_largest_cluster(search):
+    # Chains of 5, 3 and 1 agents 1 apart, the chains 10 apart
+    pos = np.array([[0, 0], [1, 0], [2, 0], [3, 0], [4, 0],
+                    [0, 10], [1, 10], [2, 10], [20, 20]], dtype=float)
+    assert order.largest_cluster(pos, 1.5, search) == 5
+    assert order.largest_cluster(pos, 0.5, search) == 1
+    assert order.largest_cluster(pos, 100, search) == 9
+
+    pos = positions()
+    for radius in (0.5, 1, 2):
+        d = pairwise_distances(pos)
+        np.fill_diagonal(d, np.inf)
+        expected = graph.component_sizes((d < radius).astype(float))[0]
+        assert order.largest_cluster(pos, radius, search) == expected
+
+
+def test_order_parameters():
+    pos, tangent = circle()
+    params = order.order_parameters(pos, tangent, 2)
+    assert sorted(params) == sorted([
+        'polarization', 'milling', 'centroid_x', 'centroid_y', 'gyration',
+        'radius', 'nn_mean', 'nn_std', 'nn_min', 'nn_max',
+        'largest_cluster'])
+    assert params['milling'] == pytest.approx(1)
+    assert params['largest_cluster'] == 24
+    assert params['nn_min'] == pytest.approx(10 * np.sin(np.pi / 24))
+
+
+def test_running_stats_of_numbers():
+    values = np.random.default_rng(1).normal(3, 2, 50)
+    values[[4, 17, 30]] = np.nan
+    stats = order.RunningStats()
+    assert np.isnan(stats.var)
+    for v in values:
+        stats.update(v)
+    assert stats.count == 47
+    assert stats.mean == pytest.approx(np.nanmean(values))
+    assert stats.var == pytest.approx(np.nanvar(values, ddof=1))
+    assert stats.std == pytest.approx(np.nanstd(values, ddof=1))
+    assert stats.min == np.nanmin(values)
+    assert stats.max == np.nanmax(values)
+
+
+def test_running_stats_of_arrays():
+    values = np.random.default_rng(2).normal(0, 1, (40, 3))
+    values[::3, 0] = np.nan
+    values[:39, 2] = np.nan
+    stats = order.RunningStats()
+    for v in values:
+        stats.update(v)
+    np.testing.assert_array_equal(stats.count, [26, 40, 1])
+    np.testing.assert_allclose(stats.mean, np.nanmean(values, axis=0))
+    np.testing.assert_allclose(stats.var[:2],
+                               np.nanvar(values[:, :2], axis=0, ddof=1))
+    # A single value has no sample variance
+    assert np.isnan(stats.var[2])
+    np.testing.assert_array_equal(stats.min, np.nanmin(values, axis=0))
+    np.testing.assert_array_equal(stats.max, np.nanmax(values, axis=0))
+
+
+def test_running_stats_skip_infinities():
+    stats = order.RunningStats()
+    for v in [1.0, np.inf, 2.0, -np.inf, np.nan, 6.0]:
+        stats.update(v)
+    assert stats.count == 3
+    assert stats.mean == pytest.approx(3)
+    assert stats.var == pytest.approx(np.var([1, 2, 6], ddof=1))
+    assert (stats.min, stats.max) == (1, 6)
@@ -0,0 +1,151 @@
+import json
+import os
+import numpy as np
+import pytest
+
+from pycouzin.couzinboard import CouzinBoard, FIEDLER_KEYS
+from pycouzin.predprey_agent import PredatorAgent, PreyAgent
+from pycouzin.recorder import FIELDS, TrajectoryReader, \
+    TrajectoryRecorder
+from pycouzin.state import KINDS
+
+
+STEPS = 21
+
+
+def predator_prey(board):
+    return [PredatorAgent(board) if i % 10 == 0 else PreyAgent(board)
+            for i in range(board.n)]
+
+
+@pytest.fixture
+def run(tmp_path):
+    """
+    Records a predator/prey run in chunks of 8 steps, the last one partial,
+    and returns the reader along with what was recorded.
+    """
+    board = CouzinBoard(40, 10, predator_prey, 1, 2, 23, 5, vectorize=True,
+                        seed=3)
+    board.metrics.only('combined', 'attraction')
+    board.metrics.enable('combined', every=3)
+    expected = {'pos': [], 'ori': [], 'kind': [], 'metrics': []}
+
+    def callback(b, i, record):
+        expected['pos'].append(b.state.pos.copy())
+        expected['ori'].append(b.state.ori.copy())
+        expected['kind'].append(b.state.kind.copy())
+        expected['metrics'].append([record.get(key, np.nan)
+                                    for key in FIEDLER_KEYS])
+        rec(b, i, record)
+
+    path = str(tmp_path / 'run')
+    with TrajectoryRecorder(path, board.n, chunk=8, dtype=np.float64) as rec:
+        board.simulate(STEPS, callback=callback)
+    expected = dict((k, np.array(v, dtype=float if k == 'metrics' else None))
+                    for k, v in expected.items())
+    return TrajectoryReader(path), expected
+
+
+def test_chunks_and_meta_on_disk(run):
+    reader, expected = run
+    with open(os.path.join(reader.path, 'meta.json')) as f:
+        meta = json.load(f)
+    assert meta['steps'] == STEPS
+    assert meta['chunk'] == 8
+    assert meta['dtype'] == 'float64'
+    assert meta['chunks'] == [['000000', 0, 8], ['000001', 8, 8],
+                              ['000002', 16, 5]]
+    for name, start, count in meta['chunks']:
+        for field in FIELDS:
+            a = np.load(os.path.join(reader.path,
+                                     '%s_%s.npy' % (field, name)))
+            np.testing.assert_array_equal(
+                a, expected[field][start:start + count])
+
+
+def test_frames_round_trip(run):
+    reader, expected = run
+    assert len(reader) == reader.steps == STEPS
+    assert reader.metrics == list(FIEDLER_KEYS)
+    for t in range(STEPS):
+        for field in ('pos', 'ori', 'kind'):
+            np.testing.assert_array_equal(reader.frame(t, field),
+                                          expected[field][t])
+    np.testing.assert_array_equal(reader.frame(-1), expected['pos'][-1])
+    with pytest.raises(IndexError):
+        reader.frame(STEPS)
+    # Prey were killed during the run
+    assert (expected['kind'][0] != expected['kind'][-1]).any()
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (0, 8), (3, 7),
+                                         (5, 19), (16, 21), (4, 4)])
+@pytest.mark.parametrize('field', ['pos', 'ori', 'kind'])
+def test_windows_and_tracks_span_chunks(run, start, stop, field):
+    reader, expected = run
+    want = expected[field][start:stop]
+    np.testing.assert_array_equal(reader.window(start, stop, field), want)
+    np.testing.assert_array_equal(reader.track(7, field, start, stop),
+                                  want[:, 7])
+    got = [w for _, w in reader.windows(5, field, start, stop)]
+    if got:
+        np.testing.assert_array_equal(np.concatenate(got), want)
+
+
+def test_metrics_round_trip(run):
+    reader, expected = run
+    df = reader.metric_df()
+    assert list(df.columns) == list(FIEDLER_KEYS)
+    np.testing.assert_array_equal(df.values, expected['metrics'])
+    assert df['attraction'].notnull().all()
+    assert df['combined'].notnull().sum() == len(range(0, STEPS, 3))
+    assert df['repulsion'].isnull().all()
+
+
+def test_kinds_round_trip(run):
+    reader, _ = run
+    assert reader.types == dict((params['name'], code)
+                                for code, params in KINDS.items())
+    assert reader.colors == dict((params['name'], params['color'])
+                                 for params in KINDS.values())
+
+
+def test_boards_hold_the_recorded_steps(run):
+    reader, expected = run
+    board = reader.board(5)
+    np.testing.assert_array_equal(board.state.pos, expected['pos'][5])
+    np.testing.assert_array_equal(board.state.ori, expected['ori'][5])
+    steps = [t for t, _ in reader.boards(2, every=7)]
+    assert steps == [2, 9, 16]
+
+
+def test_float32_recordings_round_positions(tmp_path):
+    board = CouzinBoard(10, 10, predator_prey, 1, 2, 23, 5, seed=1)
+    path = str(tmp_path / 'run')
+    with TrajectoryRecorder(path, board.n) as rec:
+        rec.record(board)
+    reader = TrajectoryReader(path)
+    assert reader.frame(0).dtype == np.float32
+    np.testing.assert_array_equal(reader.frame(0),
+                                  board.state.pos.astype(np.float32))
+    assert np.isnan(reader.metric_df().values).all()
+
+
+def test_tracks_only_read_their_agent(run, monkeypatch):
+    reader, expected = run
+    # Within a chunk, the track is a view of the memory map
+    track = reader.track(7, start=9, stop=15)
+    assert np.shares_memory(track, reader._chunks[1]['pos'])
+
+    parts = []
+    concatenate = np.concatenate
+
+    def spy(arrays, *args, **kwargs):
+        parts.extend(a.shape for a in arrays)
+        return concatenate(arrays, *args, **kwargs)
+    monkeypatch.setattr(np, 'concatenate', spy)
+    track = reader.track(7)
+    assert parts == [(8, 2), (8, 2), (5, 2)]
+    np.testing.assert_array_equal(track, expected['pos'][:, 7])
+    assert reader.track(7, start=4, stop=4).shape == (0, 2)
+    assert reader.track(7, 'kind', start=4, stop=4).shape == (0,)
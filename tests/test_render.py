@@ -0,0 +1,55 @@
+import os
+import pytest
+
+from pycouzin import render
+from pycouzin.couzinboard import CouzinBoard
+from pycouzin.recorder import TrajectoryRecorder
+from pycouzin.topological_agent import TopologicalAgent
+
+
+pytest.importorskip('matplotlib')
+
+
+@pytest.fixture
+def recording(tmp_path):
+    board = CouzinBoard(10, 10, lambda b: [TopologicalAgent(b)
+                                           for _ in range(b.n)],
+                        1, 2, 23, 5, vectorize=True, seed=2)
+    board.metrics.only('attraction')
+    path = str(tmp_path / 'run')
+    with TrajectoryRecorder(path, board.n, chunk=4) as rec:
+        board.simulate(10, callback=rec)
+    return path
+
+
+@pytest.mark.parametrize('every, expected', [
+    (1, list(range(10))),
+    (3, [0, 3, 6, 9]),
+    (4, [0, 4, 8, 9]),
+    (20, [0, 9]),
+])
+def test_render_ends_on_the_final_step(recording, tmp_path, monkeypatch,
+                                       every, expected):
+    # Stand in for ffmpeg, which joins and encodes the segments
+    rendered = []
+    saved = {}
+
+    def render_segment(task):
+        _, frames, segment, _ = task
+        rendered.extend(frames.tolist())
+        open(segment, 'w').close()
+    monkeypatch.setattr(render, '_render_segment', render_segment)
+    monkeypatch.setattr(render.subprocess, 'check_call',
+                        lambda args: None)
+    save = render.FrameRenderer.save
+
+    def spy(self, t, filename):
+        saved[os.path.basename(filename)] = t
+        save(self, t, filename)
+    monkeypatch.setattr(render.FrameRenderer, 'save', spy)
+
+    out = str(tmp_path / 'out')
+    render.render(recording, out, processes=1, every=every)
+    assert rendered == expected
+    assert saved == {'first.png': 0, 'last.png': 9}
+    assert os.path.getsize(os.path.join(out, 'last.png')) > 0
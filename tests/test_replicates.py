@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from pycouzin.couzinboard import CouzinBoard
+from pycouzin.replicates import run_replicates
+from pycouzin.topological_agent import TopologicalAgent
+
+
+def agent_init(board):
+    return [TopologicalAgent(board) for _ in range(board.n)]
+
+
+def factory(n, seed):
+    board = CouzinBoard(n, 10, agent_init, 1, 2, 23, 5, vectorize=True,
+                        seed=seed)
+    board.metrics.only()
+    board.simulate(5)
+    return board
+
+
+def measure(board, n):
+    return np.linalg.norm(board.state.ori.sum(axis=0)) / n
+
+
+def test_results_do_not_depend_on_the_number_of_processes():
+    serial = run_replicates(factory, measure, [10, 20], 3, seed=5,
+                            processes=1)
+    parallel = run_replicates(factory, measure, [10, 20], 3, seed=5,
+                              processes=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert list(serial.index) == [10, 20]
+    assert list(serial.columns) == [0, 1, 2]
+
+
+def test_seed_reproduces_the_sweep():
+    first = run_replicates(factory, measure, [10, 20], 3, seed=5,
+                           processes=1)
+    again = run_replicates(factory, measure, [10, 20], 3, seed=5,
+                           processes=1)
+    other = run_replicates(factory, measure, [10, 20], 3, seed=6,
+                           processes=1)
+    pd.testing.assert_frame_equal(first, again)
+    assert not np.allclose(first.values, other.values)
+    # Every replicate gets its own stream
+    assert len(np.unique(first.values)) == first.size
+
+
+def test_replicates_keep_their_seeds_when_the_grid_grows():
+    short = run_replicates(factory, measure, [10], 3, seed=5, processes=1,
+                           labels=['a'])
+    full = run_replicates(factory, measure, [10, 20], 3, seed=5,
+                          processes=1, labels=['a', 'b'])
+    pd.testing.assert_frame_equal(short, full.loc[['a']])
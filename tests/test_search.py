@@ -0,0 +1,191 @@
+import tracemalloc
+import numpy as np
+import pytest
+
+from pycouzin import graph
+from pycouzin.agent import Agent
+from pycouzin.board import Board, SEARCHES
+from pycouzin.neighborhood import Neighborhood, pairwise_distances
+from pycouzin.search import BruteForceSearch, VerletList
+from pycouzin.vector import Vector2D
+from tests import BACKENDS, SPARSE
+
+
+def random_positions(n=80, m=10, seed=0):
+    return np.random.default_rng(seed).uniform(-m, m, (n, 2))
+
+
+def lattice_positions(side=7):
+    # Many agents are exactly 1, sqrt(2), 2, ... apart, so ties abound
+    x, y = np.meshgrid(np.arange(side), np.arange(side))
+    return np.column_stack([x.ravel(), y.ravel()]).astype(float)
+
+
+def make_search(name, pos, cell_size):
+    if name == 'verlet':
+        # Build the list at shifted positions, then move it back so the
+        # queries run on a refreshed list
+        skin = 1.0
+        shift = np.random.default_rng(1).uniform(-0.2, 0.2, pos.shape)
+        base = pos + shift
+        v = VerletList(SEARCHES['cells'](base, cell_size + skin), cell_size,
+                       skin)
+        assert v.refresh(pos)
+        return v
+    return SEARCHES[name](pos, cell_size)
+
+
+def pair_set(i, j):
+    return set(zip(i.tolist(), j.tolist()))
+
+
+def expected_pairs(pos, max_radius, min_radius=0):
+    d = pairwise_distances(pos)
+    np.fill_diagonal(d, np.inf)
+    i, j = np.nonzero((d < max_radius) & (d >= min_radius))
+    return pair_set(i, j)
+
+
+@pytest.mark.parametrize('name', BACKENDS + ['verlet'])
+@pytest.mark.parametrize('positions', [random_positions, lattice_positions])
+@pytest.mark.parametrize('max_radius, min_radius', [
+    (0, 0), (0.5, 0), (1, 0), (2.5, 0), (2.5, 1), (1000, 0), (1000, 2)])
+def test_pairs_match_brute_force(name, positions, max_radius, min_radius):
+    pos = positions()
+    search = make_search(name, pos, max(max_radius, 1))
+    i, j, d = search.pairs(max_radius, min_radius)
+    assert pair_set(i, j) == expected_pairs(pos, max_radius, min_radius)
+    np.testing.assert_allclose(d, np.sqrt(((pos[j] - pos[i]) ** 2)
+                                          .sum(axis=1)))
+
+
+@pytest.mark.parametrize('name', BACKENDS + ['verlet'])
+def test_pairs_of_some_agents(name):
+    pos = random_positions()
+    agents = np.array([3, 17, 42])
+    i, j, _ = make_search(name, pos, 3).pairs(3, agents=agents)
+    expected = set(p for p in expected_pairs(pos, 3) if p[0] in agents)
+    assert pair_set(i, j) == expected
+
+
+@pytest.mark.parametrize('name', BACKENDS + ['verlet'])
+@pytest.mark.parametrize('max_k, min_k', [(1, 0), (5, 0), (8, 3), (200, 0)])
+def test_nearest_matches_brute_force(name, max_k, min_k):
+    pos = random_positions()
+    expected = BruteForceSearch(pos).nearest(max_k, min_k)
+    nearest = make_search(name, pos, 2).nearest(max_k, min_k)
+    np.testing.assert_array_equal(nearest, expected)
+
+
+@pytest.mark.parametrize('name', BACKENDS + ['verlet'])
+def test_nearest_with_ties_ranks_by_distance(name):
+    # Tied neighbors may come in any order, but the ranked distances must
+    # agree
+    pos = lattice_positions()
+    expected = BruteForceSearch(pos).nearest(6, 2)
+    nearest = make_search(name, pos, 1).nearest(6, 2)
+    assert nearest.shape == expected.shape
+
+    def ranked(idx):
+        rows = np.arange(len(pos))[:, np.newaxis]
+        return np.sqrt(((pos[idx] - pos[rows]) ** 2).sum(axis=2))
+
+    np.testing.assert_array_equal(ranked(nearest), ranked(expected))
+    assert (nearest != np.arange(len(pos))[:, np.newaxis]).all()
+
+
+
+def sparse_verlet(search, n, side, seed=0):
+    # Agents about 1 / sqrt(density) apart, so most have fewer than a few
+    # neighbors within the list's reach and need the widening search
+    pos = np.random.default_rng(seed).uniform(0, side, (n, 2))
+    base = pos + np.random.default_rng(seed + 1).uniform(-0.4, 0.4,
+                                                         pos.shape)
+    v = VerletList(SEARCHES[search](base, 3), 1, 2)
+    assert v.refresh(pos)
+    return pos, v
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+@pytest.mark.parametrize('max_k, min_k', [(1, 0), (5, 0), (8, 3),
+                                          (299, 0)])
+def test_verlet_nearest_beyond_the_skin(search, max_k, min_k):
+    pos, v = sparse_verlet(search, 300, 60)
+    expected = BruteForceSearch(pos).nearest(max_k, min_k)
+    np.testing.assert_array_equal(v.nearest(max_k, min_k), expected)
+
+
+def test_verlet_nearest_of_many_agents_runs_in_bounded_memory():
+    # Comparing the agents beyond the skin with every agent would take
+    # n * n * 16 bytes, 6.4 GB here
+    n = 20000
+    pos, v = sparse_verlet('cells', n, 500)
+    tracemalloc.start()
+    try:
+        nearest = v.nearest(5)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 200 * 2 ** 20
+    np.testing.assert_array_equal(nearest,
+                                  SEARCHES['cells'](pos, 3).nearest(5))
+
+@pytest.mark.parametrize('name', BACKENDS + ['verlet'])
+def test_zone_edges_match_brute_force(name):
+    pos = random_positions()
+    rr, ro, ra, k = 1, 2.5, 4, 5
+    expected = Neighborhood(pos, rr, ro, ra, k, BruteForceSearch(pos))
+    nb = Neighborhood(pos, rr, ro, ra, k, make_search(name, pos, ra))
+
+    i, j, labels = nb.edges()
+    ei, ej, elabels = expected.edges()
+    assert set(zip(i.tolist(), j.tolist(), labels.tolist())) == \
+        set(zip(ei.tolist(), ej.tolist(), elabels.tolist()))
+    np.testing.assert_array_equal(nb.nearest, expected.nearest)
+
+
+def make_board(pos, search, sparse):
+    n = len(pos)
+
+    def agent_init(board):
+        return [Agent(board, Vector2D(x, y), Vector2D(1, 0))
+                for x, y in pos]
+    return Board(n, 10, agent_init, search=search, sparse=sparse)
+
+
+def dense(a):
+    return a.toarray() if graph.issparse(a) else np.asarray(a)
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+@pytest.mark.parametrize('sparse', SPARSE)
+@pytest.mark.parametrize('positions', [random_positions, lattice_positions])
+@pytest.mark.parametrize('max_radius, min_radius', [
+    (0, 0), (1, 0), (3, 1), (1000, 0)])
+def test_radius_adjacency(search, sparse, positions, max_radius,
+                          min_radius):
+    pos = positions()
+    a = make_board(pos, search, sparse).radius_adjacency(max_radius,
+                                                         min_radius)
+    assert graph.issparse(a) == sparse
+    expected = np.zeros((len(pos), len(pos)))
+    for i, j in expected_pairs(pos, max_radius, min_radius):
+        expected[i, j] = 1
+    np.testing.assert_array_equal(dense(a), expected)
+
+
+@pytest.mark.parametrize('search', BACKENDS)
+@pytest.mark.parametrize('sparse', SPARSE)
+@pytest.mark.parametrize('max_k, min_k', [(1, 0), (5, 2), (500, 0)])
+def test_nearest_adjacency(search, sparse, max_k, min_k):
+    pos = random_positions()
+    board = make_board(pos, search, sparse)
+    a = board.nearest_adjacency(max_k, min_k)
+    assert graph.issparse(a) == sparse
+
+    expected = np.zeros((len(pos), len(pos)))
+    nearest = BruteForceSearch(pos).nearest(max_k, min_k)
+    for j in range(len(pos)):
+        expected[nearest[j], j] = 1
+    np.testing.assert_array_equal(dense(a), expected)
+    assert [agent.nearest for agent in board.agents] == nearest.tolist()
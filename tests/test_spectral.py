@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from numpy import linalg as la
+
+from pycouzin import graph, spectral
+from pycouzin.agent import Agent
+from pycouzin.board import Board
+from pycouzin.search import KDTreeSearch
+from pycouzin.vector import Vector2D
+from tests import requires_scipy
+
+
+# The iterative solvers and the sparse laplacians all need SciPy
+pytestmark = requires_scipy
+
+
+N = spectral.DENSE_LIMIT + 300
+
+
+def cluster_positions(clusters, n=N, seed=0):
+    # Clusters of agents far enough apart that each is its own component
+    rng = np.random.default_rng(seed)
+    centers = 100 * np.arange(clusters)[:, None] * np.array([[1, 0]])
+    pos = rng.uniform(0, 12, (n, 2))
+    return pos + centers[np.arange(n) % clusters]
+
+
+def laplacian_of(pos, radius=2.0, as_sparse=True):
+    i, j, _ = KDTreeSearch(pos, radius).pairs(radius)
+    a = graph.adjacency_matrix(i, j, len(pos), as_sparse=as_sparse)
+    return graph.laplacian(a)
+
+
+def exact(l):
+    return la.eigvalsh(l.toarray() if graph.issparse(l) else l)[1]
+
+
+@pytest.mark.parametrize('method', ['auto', 'lobpcg', 'lanczos'])
+@pytest.mark.parametrize('tolerance', [None, 1e-4, 1e-12])
+@pytest.mark.parametrize('as_sparse', [True, False])
+@pytest.mark.parametrize('clusters', [1, 2, 10])
+def test_matches_eigvalsh(method, tolerance, as_sparse, clusters):
+    l = laplacian_of(cluster_positions(clusters), as_sparse=as_sparse)
+    expected = exact(l)
+    value, vector = spectral.fiedler(l, method, tolerance)
+    tol = 1e-8 * np.abs(l.diagonal()).max() if tolerance is None \
+        else tolerance
+    assert abs(value - expected) <= tol
+    if clusters > 1:
+        assert value == 0
+    if vector is not None:
+        assert la.norm(l.dot(vector) - value * vector) <= tol
+
+
+@pytest.mark.parametrize('method', ['lobpcg', 'lanczos'])
+def test_warm_start_converges_on_first_call(method):
+    pos = cluster_positions(1)
+    l = laplacian_of(pos)
+    _, v = spectral.fiedler(l, method)
+    moved = laplacian_of(pos + np.random.default_rng(1).normal(0, 0.05,
+                                                              pos.shape))
+    value, _ = spectral.fiedler(moved, method, v0=v)
+    assert abs(value - exact(moved)) <= 1e-8 * moved.diagonal().max()
+
+
+def test_weighted_and_shifted_matrices():
+    # Not graph laplacians, so there is no deflation of the constant vector
+    l = laplacian_of(cluster_positions(1))
+    shifted = l + graph.sparse.identity(N, format='csc')
+    for method in ['lobpcg', 'lanczos']:
+        value, _ = spectral.fiedler(shifted, method)
+        assert abs(value - exact(shifted)) <= 1e-8 * shifted.diagonal().max()
+    assert spectral.fiedler(shifted)[1] is None
+
+
+@pytest.mark.parametrize('clusters', [1, 3])
+@pytest.mark.parametrize('as_sparse', [True, False])
+def test_spectral_connectivity_agrees_with_graph(clusters, as_sparse):
+    pos = cluster_positions(clusters)
+
+    def agent_init(board):
+        return [Agent(board, Vector2D(x, y), Vector2D(1, 0))
+                for x, y in pos]
+    board = Board(N, 10, agent_init, search='kdtree', sparse=as_sparse)
+    l = laplacian_of(pos, as_sparse=as_sparse)
+    assert board.is_connected(l, method='spectral') == \
+        board.is_connected(l, method='graph') == (clusters == 1)